@@ -1,27 +1,42 @@
 from __future__ import print_function
-import pyorbit
 import argparse
 import os
 import sys
 
 if __name__ == '__main__':
 
+    parser = argparse.ArgumentParser(prog='PyORBIT_run.py', description='PyORBIT runner')
+    parser.add_argument('sampler', type=str, nargs=1, help='sampler (emcee or polychord)')
+    parser.add_argument('config_file', type=str, nargs=1, help='config file')
+    parser.add_argument('-mpi', action='store_true', help='use an MPI pool for emcee and PyDE (run with mpirun)')
+
+    args = parser.parse_args()
+
+    """ With the MPI pool only the master process (rank 0) prints to screen, the standard output of the workers
+    is suppressed before pyorbit is imported, so that the warnings at import time are not repeated either """
+    if args.mpi:
+        from mpi4py import MPI
+        if MPI.COMM_WORLD.Get_rank() != 0:
+            sys.stdout = open(os.devnull, 'w')
+
+    import pyorbit
+
     print('PyORBIT v8.x')
     print()
     print('Python version in use:')
     print(sys.version)
     print()
 
-    parser = argparse.ArgumentParser(prog='PyORBIT_run.py', description='PyORBIT runner')
-    parser.add_argument('sampler', type=str, nargs=1, help='sampler (emcee or polychord)')
-    parser.add_argument('config_file', type=str, nargs=1, help='config file')
-
-    args = parser.parse_args()
     sampler = args.sampler[0]
     file_conf = args.config_file[0]
 
     config_in = pyorbit.yaml_parser(file_conf)
 
+    if args.mpi:
+        if config_in['solver'] is None:
+            config_in['solver'] = {}
+        config_in['solver']['use_mpi_pool'] = True
+
     sampler_keyword = {
         'multinest':['multinest', 'MultiNest', 'multi'],
         'polychord':['polychord', 'PolyChord', 'polychrod', 'poly'],
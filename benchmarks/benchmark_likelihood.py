@@ -0,0 +1,252 @@
+""" Benchmarks of the likelihood computation over the example configurations
+
+For each YAML file, the datasets and the models are loaded through pars_input and model_setup, then:
+    * the setup time and the memory allocated during the setup are measured
+    * the log-likelihood is evaluated at a fixed set of random theta (one at a time and, when the batch
+      log-probability is available, as a population), and the number of evaluations per second is recorded
+    * Dataset.compute and the lnlk_compute method of each Gaussian Process are timed separately, through the
+      datasets and the models of the model container only, so that the results of different versions of PyORBIT
+      can be compared
+A microbenchmark of kepler_exo.kepler_E is performed once for each run.
+
+Results are stored in a JSON file, a previous output can be provided to print the speedup of each benchmark
+
+Usage:
+    python benchmarks/benchmark_likelihood.py [config files] [-n 200] [-seed 1] [-output file.json]
+                                              [-compare previous.json]
+"""
+from __future__ import print_function
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tracemalloc
+from timeit import default_timer
+
+import numpy as np
+
+benchmark_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(benchmark_dir))
+
+import pyorbit
+import pyorbit.classes.kepler_exo as kepler_exo
+from pyorbit.classes.model_container_emcee import ModelContainerEmcee
+from pyorbit.classes.input_parser import yaml_parser, pars_input
+
+
+def time_function(function, n_repeat, *args):
+    """ Average wall-time of a function call, in seconds """
+    function(*args)
+    time_start = default_timer()
+    for i in range(0, n_repeat):
+        function(*args)
+    return (default_timer() - time_start) / n_repeat
+
+
+def benchmark_kepler(n_repeat=200):
+    output = {}
+    for n_points in [100, 10000]:
+        M = np.linspace(0., 2 * np.pi, n_points)
+        for ecc in [0.1, 0.9]:
+            output['kepler_E_{0:d}_e{1:.1f}'.format(n_points, ecc)] = \
+                time_function(kepler_exo.kepler_E, n_repeat, M, ecc)
+    return output
+
+
+def setup_model_container(file_conf):
+    """ Same sequence of calls performed by the drivers before sampling, the output of the setup is
+    suppressed """
+    config_in = yaml_parser(file_conf)
+    with contextlib.redirect_stdout(io.StringIO()):
+        mc = ModelContainerEmcee()
+        pars_input(config_in, mc)
+        mc.model_setup()
+        mc.create_variables_bounds()
+        mc.initialize_logchi2()
+    return mc
+
+
+def benchmark_configuration(file_conf, n_evaluations, seed):
+
+    output = {}
+
+    tracemalloc.start()
+    time_start = default_timer()
+    mc = setup_model_container(file_conf)
+    output['setup_time'] = default_timer() - time_start
+    output['setup_memory'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    output['ndim'] = int(mc.ndim)
+    output['n_datapoints'] = int(sum(dataset.n for dataset in mc.dataset_dict.values()))
+
+    """ Random theta are drawn in the central part of the parameter space, to avoid most of the
+    early rejections from the priors """
+    rng = np.random.RandomState(seed)
+    thetas = mc.bounds[:, 0] + (mc.bounds[:, 1] - mc.bounds[:, 0]) * \
+        rng.uniform(0.3, 0.7, size=[n_evaluations, mc.ndim])
+
+    mc(thetas[0, :])
+    time_start = default_timer()
+    for theta in thetas:
+        mc(theta)
+    output['evaluations_per_second'] = n_evaluations / (default_timer() - time_start)
+
+    """ The batch log-probability is not available in older versions """
+    if mc.dynamical_model is None and hasattr(mc, 'log_priors_likelihood_batch'):
+        time_start = default_timer()
+        mc(thetas)
+        output['batch_evaluations_per_second'] = n_evaluations / (default_timer() - time_start)
+
+    """ Dataset.compute and GP log-likelihoods are timed on the residuals of the last evaluation. Only the
+    datasets and models of the model container are used, so that the same benchmarks can be compared
+    across versions """
+    theta = thetas[-1, :]
+    n_repeat = max(n_evaluations // 10, 1)
+
+    output['dataset_compute'] = {}
+    output['gp_lnlk_compute'] = {}
+
+    for dataset_name, dataset in mc.dataset_dict.items():
+
+        variable_values = dataset.convert(theta)
+
+        def dataset_compute():
+            dataset.model_reset()
+            dataset.compute(variable_values)
+
+        output['dataset_compute'][dataset_name] = time_function(dataset_compute, n_repeat)
+
+        for model_name in dataset.models:
+            model = mc.models.get(model_name, None)
+            if not getattr(model, 'internal_likelihood', False):
+                continue
+
+            mc(theta)
+            gp_values = {}
+            for common_ref in model.common_ref:
+                gp_values.update(mc.common_models[common_ref].convert(theta))
+            gp_values.update(model.convert(theta, dataset_name))
+
+            if hasattr(model, 'delayed_lnlk_computation'):
+                def gp_compute():
+                    model.add_internal_dataset(gp_values, dataset, reset_status=[])
+                    return model.lnlk_compute()
+            else:
+                def gp_compute():
+                    return model.lnlk_compute(gp_values, dataset)
+
+            output['gp_lnlk_compute'][dataset_name + '_' + model_name] = time_function(gp_compute, n_repeat)
+
+    output['max_resident_memory'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    return output
+
+
+def get_git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=benchmark_dir,
+                                       stderr=subprocess.STDOUT).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results, previous):
+    """ Ratio between the current and the previous performances, values larger than one are speedups """
+
+    print()
+    print('{0:60s} {1:>12s} {2:>12s} {3:>8s}'.format('benchmark', 'previous', 'current', 'speedup'))
+
+    def compare(name, current_value, previous_value, higher_is_better):
+        if previous_value is None or current_value is None or previous_value == 0. or current_value == 0.:
+            return
+        speedup = current_value / previous_value if higher_is_better else previous_value / current_value
+        print('{0:60s} {1:12.6g} {2:12.6g} {3:8.2f}'.format(name, previous_value, current_value, speedup))
+
+    for key_name, value in results['kepler'].items():
+        compare(key_name, value, previous.get('kepler', {}).get(key_name), False)
+
+    for file_name, configuration in results['configurations'].items():
+        previous_configuration = previous.get('configurations', {}).get(file_name, {})
+        if 'error' in configuration or 'error' in previous_configuration:
+            continue
+        for key_name in ['evaluations_per_second', 'batch_evaluations_per_second']:
+            compare(file_name + ' ' + key_name, configuration.get(key_name),
+                    previous_configuration.get(key_name), True)
+        compare(file_name + ' setup_time', configuration['setup_time'],
+                previous_configuration.get('setup_time'), False)
+        for group_name in ['dataset_compute', 'gp_lnlk_compute']:
+            for key_name, value in configuration[group_name].items():
+                compare(file_name + ' ' + group_name + ' ' + key_name, value,
+                        previous_configuration.get(group_name, {}).get(key_name), False)
+    print()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(prog='benchmark_likelihood.py', description='PyORBIT likelihood benchmarks')
+    parser.add_argument('config_file', type=str, nargs='*', help='config files (default: examples/*.yaml)')
+    parser.add_argument('-n', type=int, default=200, help='number of likelihood evaluations')
+    parser.add_argument('-seed', type=int, default=1, help='seed for the random theta')
+    parser.add_argument('-output', type=str, default=None, help='output JSON file')
+    parser.add_argument('-compare', type=str, default=None, help='previous JSON file for comparison')
+    args = parser.parse_args()
+
+    config_files = [os.path.abspath(file_conf) for file_conf in args.config_file]
+    if not config_files:
+        config_files = sorted(glob.glob(os.path.join(os.path.dirname(benchmark_dir), 'examples', '*.yaml')))
+
+    results = {
+        'pyorbit_version': pyorbit.__version__,
+        'git_revision': get_git_revision(),
+        'date': datetime.datetime.now().isoformat(),
+        'python_version': platform.python_version(),
+        'numpy_version': np.__version__,
+        'platform': platform.platform(),
+        'n_evaluations': args.n,
+        'seed': args.seed,
+        'kepler': benchmark_kepler(),
+        'configurations': {}
+    }
+
+    working_dir = os.getcwd()
+    for file_conf in config_files:
+        file_name = os.path.basename(file_conf)
+        print('Benchmarking: ', file_name)
+
+        """ Datasets are referenced with relative paths in the configuration files """
+        os.chdir(os.path.dirname(file_conf))
+        try:
+            results['configurations'][file_name] = benchmark_configuration(file_conf, args.n, args.seed)
+            print('    {0:12.2f} evaluations per second'.format(
+                results['configurations'][file_name]['evaluations_per_second']))
+        except Exception as error:
+            results['configurations'][file_name] = {'error': type(error).__name__ + ': ' + str(error)}
+            print('    skipped, ', results['configurations'][file_name]['error'])
+        os.chdir(working_dir)
+
+    if args.output is None:
+        results_dir = os.path.join(benchmark_dir, 'results')
+        if not os.path.exists(results_dir):
+            os.makedirs(results_dir)
+        output_file = os.path.join(results_dir, 'benchmark_{0:s}_{1:s}.json'.format(
+            results['git_revision'] or 'v' + pyorbit.__version__,
+            datetime.datetime.now().strftime('%Y%m%d_%H%M%S')))
+    else:
+        output_file = args.output
+
+    with open(output_file, 'w') as file_output:
+        json.dump(results, file_output, indent=2)
+    print()
+    print('Results saved in ', output_file)
+
+    if args.compare:
+        with open(args.compare, 'r') as file_input:
+            print_comparison(results, json.load(file_input))
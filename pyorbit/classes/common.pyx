@@ -1,7 +1,7 @@
 from __future__ import print_function
 import os
 import sys
-from scipy import stats
+from scipy import stats, special
 from scipy.interpolate import splrep, splev
 import pyorbit.classes.constants as constants
 import yaml
@@ -149,6 +149,29 @@ def get_2var_c2(var, fix, i):
     return np.sqrt(q1, dtype=np.double) * (1.0 - 2.0*q2)
 
 
+def get_population_columns(variable_value):
+    """ When theta is a 2-D array (one row for each walker of a population), the physical parameters
+    obtained from the transformation functions are 1-D arrays of length n_walkers. These are reshaped into
+    (n_walkers, 1) column vectors so that they broadcast against the epochs of a dataset, and the models
+    are computed as (n_walkers, n_epochs) matrices.
+    Scalar values (e.g. fixed parameters) are left untouched, and the input dictionary is returned as it is
+    when theta is a 1-D array
+
+    :param variable_value: dictionary with the physical parameters
+    :return: dictionary with the parameters ready for broadcasting
+    """
+    if not any(np.ndim(val) > 0 for val in variable_value.values()):
+        return variable_value
+
+    output = {}
+    for var, val in variable_value.items():
+        if np.ndim(val) > 0:
+            output[var] = np.reshape(val, (-1, 1))
+        else:
+            output[var] = val
+    return output
+
+
 def get_2darray_from_val(val):
     out = np.zeros(2, dtype=np.double)
     try:
@@ -204,6 +227,95 @@ def giveback_priors(kind, bounds, pams, val):
         return np.log(stats.beta.pdf((val-bounds[0])/(bounds[1]-bounds[0]), pams[0], pams[1]))
 
 
+def giveback_priors_prepare(prior_list):
+    """ Group the priors according to their kind, to compute all the priors of the same kind with a single
+    vectorized expression (see giveback_priors for the definition of each prior)
+
+    :param prior_list: list of [slot, kind, bounds, pams], where slot is the position of the parameter in the
+        vector of physical parameters
+    :return: constant term of the log-prior, list of (kind, slots, coefficients) tuples
+    """
+
+    priors_constant = 0.00
+    priors_kind = {}
+
+    for slot, kind, bounds, pams in prior_list:
+
+        if kind == 'None':
+            continue
+
+        if kind == 'Uniform':
+            priors_constant += np.log(1./(bounds[1]-bounds[0]))
+            continue
+
+        if kind == 'Gaussian':
+            coeff = [pams[0], 1. / (2 * pams[1] ** 2)]
+        elif kind == 'Jeffreys' or kind == 'TruncatedJeffreys':
+            kind = 'Jeffreys'
+            coeff = [-np.log(np.log(bounds[1]/bounds[0]))]
+        elif kind in ['ModifiedJeffreys', 'TruncatedModifiedJeffreys', 'WhiteNoisePrior']:
+            kind = 'ModifiedJeffreys'
+            coeff = [pams[0], -np.log(np.log(1.+bounds[1]/pams[0]))]
+        elif kind == 'TruncatedRayleigh':
+            coeff = [pams[0], -np.log(1. - np.exp(-0.5*(bounds[1]/pams[0])**2))]
+        elif kind == 'BetaDistribution':
+            coeff = [bounds[0], 1./(bounds[1]-bounds[0]), pams[0] - 1., pams[1] - 1., -special.betaln(pams[0], pams[1])]
+        else:
+            """ Priors without a vectorized expression are computed one at a time through giveback_priors"""
+            coeff = [kind, bounds, pams]
+            kind = 'Other'
+
+        priors_kind.setdefault(kind, [[], []])
+        priors_kind[kind][0].append(slot)
+        priors_kind[kind][1].append(coeff)
+
+    priors_groups = []
+    for kind, (slots, coeff) in priors_kind.items():
+        if kind == 'Other':
+            priors_groups.append((kind, np.asarray(slots, dtype=int), coeff))
+        else:
+            priors_groups.append((kind, np.asarray(slots, dtype=int), np.asarray(coeff, dtype=np.double).T))
+
+    return priors_constant, priors_groups
+
+
+def giveback_priors_compute(priors_constant, priors_groups, parameters):
+    """ Log-prior for a vector of physical parameters, or an array of log-priors if parameters is a
+    (n_walkers, n_parameters) matrix
+
+    :param priors_constant: constant term from giveback_priors_prepare
+    :param priors_groups: groups of priors from giveback_priors_prepare
+    :param parameters: vector (or matrix) of physical parameters
+    :return: log-prior
+    """
+    prior_out = priors_constant
+
+    for kind, slots, coeff in priors_groups:
+        val = parameters[..., slots]
+
+        if kind == 'Gaussian':
+            prior_out = prior_out - np.sum((val - coeff[0]) ** 2 * coeff[1], axis=-1)
+
+        elif kind == 'Jeffreys':
+            prior_out = prior_out + np.sum(coeff[0] - np.log(val), axis=-1)
+
+        elif kind == 'ModifiedJeffreys':
+            prior_out = prior_out + np.sum(coeff[1] - np.log(coeff[0] + val), axis=-1)
+
+        elif kind == 'TruncatedRayleigh':
+            prior_out = prior_out + np.sum(np.log(val/coeff[0]**2) - 0.5*(val/coeff[0])**2 + coeff[1], axis=-1)
+
+        elif kind == 'BetaDistribution':
+            x = (val - coeff[0]) * coeff[1]
+            prior_out = prior_out + np.sum(special.xlogy(coeff[2], x) + special.xlog1py(coeff[3], -x) + coeff[4],
+                                           axis=-1)
+        else:
+            for i_slot, (prior_kind, bounds, pams) in enumerate(coeff):
+                prior_out = prior_out + giveback_priors(prior_kind, bounds, pams, val[..., i_slot])
+
+    return prior_out
+
+
 """
 DEPRECATED
 Special subroutine to transform MultiNest/PolyChord priors, i.e., trasnform the datacube from [0:1] to physical 
@@ -224,11 +336,17 @@ def nested_sampling_prior_transformation(kind, bounds, pams):
 """
 
 
+""" Coefficients from nested_sampling_prior_prepare, for each combination of prior kind, bounds, parameters and
+sampling space """
+nested_sampling_prior_cache = {}
+
+
 def nested_sampling_prior_prepare(kind, bounds, pams, space):
     """
     This subroutine computes the coefficient of the spline interpolation of the inverse cumulative function
     In some special cases, ruterns the parameters required by the intrinsic function, e.g. scipi.stats.norm.icf
     according to their implementation in nested_sampling_prior_compute()
+    The spline coefficients are cached, since the same prior is often shared by several parameters
 
     :param kind: type of prior
     :param bounds: list/array with lower and upper limits for parameter exploration
@@ -257,15 +375,21 @@ def nested_sampling_prior_prepare(kind, bounds, pams, space):
         print()
         quit()
 
+    cache_key = (kind, tuple(np.atleast_1d(bounds).tolist()), tuple(np.atleast_1d(pams).tolist()), space)
+    if cache_key in nested_sampling_prior_cache:
+        return nested_sampling_prior_cache[cache_key]
+
     x_var = np.linspace(0.000000, 1.000000, num=10001, endpoint=True, dtype=np.double)*(bounds[1]-bounds[0]) + bounds[0]
-    area = np.zeros(len(x_var), dtype=np.double)
 
-    for x_num, x_val in enumerate(x_var):
-        area[x_num:] += np.exp(giveback_priors(kind, bounds, pams, x_val)) * (1. / 10000.) + 0.000000000001
+    """ Cumulative integration of the prior over the grid, giveback_priors is evaluated on the whole grid
+    (the output may be a scalar for priors that do not depend on the value of the parameter)"""
+    area = np.cumsum(np.exp(giveback_priors(kind, bounds, pams, x_var)) * (1. / 10000.) + 0.000000000001
+                     + np.zeros(len(x_var), dtype=np.double))
     area[0] = 0
     area /= area[-1]
 
-    return splrep(area, x_var)
+    nested_sampling_prior_cache[cache_key] = splrep(area, x_var)
+    return nested_sampling_prior_cache[cache_key]
 
 
 def nested_sampling_prior_compute(val, kind, coeff, space):
@@ -297,6 +421,93 @@ def nested_sampling_prior_compute(val, kind, coeff, space):
     return splev(val, coeff)
 
 
+def nested_sampling_prior_transform_prepare(priors, bounds, spaces):
+    """ Group the parameters according to the kind of prior, to transform all the parameters of the same kind
+    from the unit hypercube with a single vectorized expression (see nested_sampling_prior_compute for the
+    definition of each transformation). The spline of the inverse cumulative function of the other priors is
+    tabulated on a regular grid of the unit interval, refined close to the edges where the inverse cumulative
+    function of priors going to zero at the boundaries (e.g. TruncatedRayleigh) is steeper
+
+    :param priors: list of [kind, pams] for each parameter
+    :param bounds: boundaries of each parameter, in the sampling space
+    :param spaces: list with the sampling space of each parameter
+    :return: list of (kind, indexes, coefficients) tuples
+    """
+
+    table_edges = np.logspace(-12., -1., num=221, dtype=np.double)
+    table_grid = np.unique(np.concatenate([np.linspace(0.000000, 1.000000, num=10001, endpoint=True, dtype=np.double),
+                                           table_edges, 1. - table_edges]))
+    transform_kind = {}
+
+    for i_theta, (prior, space) in enumerate(zip(priors, spaces)):
+        kind = prior[0]
+        coeff = nested_sampling_prior_prepare(kind, bounds[i_theta], prior[1], space)
+
+        if kind == 'Uniform':
+            coeff = [coeff[0], coeff[1] - coeff[0]]
+        elif kind == 'Gaussian' or kind == 'beta':
+            coeff = [coeff[0], coeff[1]]
+            if space == 'Logarithmic':
+                kind = 'Logarithmic_' + kind
+        else:
+            coeff = splev(table_grid, coeff)
+            kind = 'Tabulated'
+
+        transform_kind.setdefault(kind, [[], []])
+        transform_kind[kind][0].append(i_theta)
+        transform_kind[kind][1].append(coeff)
+
+    transform_groups = []
+    for kind, (indexes, coeff) in transform_kind.items():
+        if kind == 'Tabulated':
+            coeff = [table_grid, np.asarray(coeff, dtype=np.double)]
+        else:
+            coeff = np.asarray(coeff, dtype=np.double).T
+        transform_groups.append((kind, np.asarray(indexes, dtype=int), coeff))
+
+    return transform_groups
+
+
+def nested_sampling_prior_transform_compute(cube, transform_groups, theta):
+    """ Transformation of the unit hypercube into the parameter space, theta can be the cube itself for an
+    in-place transformation
+
+    :param cube: array with the coordinates in the unit hypercube
+    :param transform_groups: groups of parameters from nested_sampling_prior_transform_prepare
+    :param theta: output array
+    :return: theta
+    """
+
+    for kind, indexes, coeff in transform_groups:
+        val = cube[indexes]
+
+        if kind == 'Uniform':
+            theta[indexes] = val * coeff[1] + coeff[0]
+
+        elif kind == 'Gaussian':
+            theta[indexes] = coeff[0] - coeff[1] * special.ndtri(val)
+
+        elif kind == 'Logarithmic_Gaussian':
+            theta[indexes] = np.log2(coeff[0] - coeff[1] * special.ndtri(val))
+
+        elif kind == 'beta':
+            theta[indexes] = stats.beta.isf(val, coeff[0], coeff[1])
+
+        elif kind == 'Logarithmic_beta':
+            theta[indexes] = np.log2(stats.norm.isf(stats.beta.isf(val, coeff[0], coeff[1])))
+
+        else:
+            """ Linear interpolation of the tabulated inverse cumulative functions, the grid is shared by all
+            the parameters, each row of the table corresponds to a parameter """
+            table_grid, table = coeff
+            i_grid = np.clip(np.searchsorted(table_grid, val, side='right') - 1, 0, len(table_grid) - 2)
+            fraction = (val - table_grid[i_grid]) / (table_grid[i_grid + 1] - table_grid[i_grid])
+            i_row = np.arange(0, len(indexes))
+            theta[indexes] = table[i_row, i_grid] * (1. - fraction) + table[i_row, i_grid + 1] * fraction
+
+    return theta
+
+
 def compute_value_sigma(samples):
     if np.size(np.shape(samples)) == 1:
         sample_med = np.zeros(3)
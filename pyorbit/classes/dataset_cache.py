@@ -0,0 +1 @@
+dataset_cache.pyx
\ No newline at end of file
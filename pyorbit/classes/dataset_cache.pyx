@@ -0,0 +1,106 @@
+from __future__ import print_function
+import numpy as np
+import hashlib
+import json
+import os
+
+__all__ = ["dataset_cache_directory", "dataset_cache_load", "dataset_cache_save"]
+
+"""
+Binary cache of the dataset files
+
+The array parsed from a text file is saved as a .npy file, in column-major order so that each column of the
+memory-mapped array is contiguous. A JSON file stores the path, size, modification time and SHA-1 hash of the
+source file: the cache is used only when size and modification time are unchanged, or when the content hash
+is the same (e.g. for a file that has been copied or touched), otherwise the text file is parsed again and the
+cache is overwritten.
+Cache files are named after the basename of the source file and the hash of its absolute path.
+"""
+
+
+def dataset_cache_directory(cache_option=True):
+    """ Directory of the cache from the dataset_cache keyword in the parameters section of the configuration file:
+    True for the default location, False to disable the cache, or the path of the directory """
+    if cache_option is None or cache_option is False:
+        return None
+    if cache_option is True:
+        cache_root = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cache_root, 'pyorbit', 'datasets')
+    return str(cache_option)
+
+
+def _file_hash(input_file):
+    file_hash = hashlib.sha1()
+    with open(input_file, 'rb') as file_input:
+        for block in iter(lambda: file_input.read(2 ** 20), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def _cache_names(source_path, cache_directory):
+    cache_name = os.path.basename(source_path) + '_' + hashlib.sha1(source_path.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_directory, cache_name + '.npy'), os.path.join(cache_directory, cache_name + '.json')
+
+
+def _write_atomic(file_name, write_function):
+    """ Files are replaced only when completely written, to be safe with several processes sharing the cache """
+    temporary_file = file_name + '.' + repr(os.getpid()) + '.tmp'
+    with open(temporary_file, 'wb') as file_output:
+        write_function(file_output)
+    os.replace(temporary_file, file_name)
+
+
+def dataset_cache_load(input_file, cache_directory):
+    """ Cached array of the input file, memory-mapped in copy-on-write mode
+
+    :return: the array, or None if the cache is missing or outdated, and the status of the source file to be
+        passed to dataset_cache_save
+    """
+    source_path = os.path.abspath(input_file)
+    source_stat = os.stat(source_path)
+    array_file, metadata_file = _cache_names(source_path, cache_directory)
+
+    try:
+        with open(metadata_file, 'r') as metadata_input:
+            metadata = json.load(metadata_input)
+
+        if metadata['path'] != source_path or metadata['size'] != source_stat.st_size:
+            return None, source_stat
+
+        if metadata['mtime_ns'] != source_stat.st_mtime_ns:
+            if metadata['sha1'] != _file_hash(source_path):
+                return None, source_stat
+            metadata['mtime_ns'] = source_stat.st_mtime_ns
+            _write_atomic(metadata_file, lambda file_output: file_output.write(json.dumps(metadata).encode()))
+
+        return np.load(array_file, mmap_mode='c'), source_stat
+
+    except (OSError, ValueError, KeyError):
+        return None, source_stat
+
+
+def dataset_cache_save(input_file, cache_directory, data_input, source_stat):
+    """ Save the array parsed from the input file. Nothing is saved if the file has been modified after
+    source_stat was taken, or if the cache directory is not writable """
+    source_path = os.path.abspath(input_file)
+    array_file, metadata_file = _cache_names(source_path, cache_directory)
+
+    try:
+        if os.stat(source_path).st_mtime_ns != source_stat.st_mtime_ns:
+            return
+
+        metadata = {
+            'path': source_path,
+            'size': source_stat.st_size,
+            'mtime_ns': source_stat.st_mtime_ns,
+            'sha1': _file_hash(source_path)
+        }
+
+        if not os.path.exists(cache_directory):
+            os.makedirs(cache_directory, exist_ok=True)
+
+        _write_atomic(array_file, lambda file_output: np.save(file_output, np.asfortranarray(data_input)))
+        _write_atomic(metadata_file, lambda file_output: file_output.write(json.dumps(metadata).encode()))
+
+    except OSError as error:
+        print('Dataset cache not updated: ', error)
@@ -1,5 +1,6 @@
 from __future__ import print_function
 from ..models.dataset import *
+from .dataset_cache import dataset_cache_directory
 from ..models.planets import CommonPlanets
 from ..models.activity import CommonActivity
 from ..models.radial_velocities import RVkeplerian, RVdynamical, TransitTimeKeplerian, TransitTimeDynamical, DynamicalIntegrator
@@ -30,6 +31,7 @@ from ..models.batman_limb_darkening import Batman_LimbDarkening_Linear, Batman_L
 from ..models.dilution_factor import CommonDilutionFactor, DilutionFactor
 from ..models.normalization_factor import CommonNormalizationFactor, NormalizationFactor
 from ..models.star_parameters import CommonStarParameters
+from .profiling import LikelihoodProfiler
 
 __all__ = ["pars_input", "yaml_parser"]
 
@@ -170,6 +172,9 @@ def pars_input(config_in, mc, input_datasets=None, reload_emcee=False, shutdown_
 
         return
 
+    """ Parsed data files are cached as .npy files, the cache is disabled with dataset_cache: False """
+    dataset_cache = dataset_cache_directory(conf_parameters.get('dataset_cache', True))
+
     for dataset_name, dataset_conf in conf_inputs.items():
 
         if not isinstance(dataset_name, str):
@@ -187,7 +192,8 @@ def pars_input(config_in, mc, input_datasets=None, reload_emcee=False, shutdown_
             data_input = input_datasets[dataset_name]
         except:
             try:
-                data_input = mc.dataset_dict[dataset_name].convert_dataset_from_file(dataset_conf['file'])
+                data_input = mc.dataset_dict[dataset_name].convert_dataset_from_file(dataset_conf['file'],
+                                                                                      dataset_cache)
             except:
                 print('Either a file or an input dataset must be provided')
                 quit()
@@ -592,6 +598,15 @@ def pars_input(config_in, mc, input_datasets=None, reload_emcee=False, shutdown_
     if 'ordered_planets' in conf_parameters:
         mc.ordered_planets = conf_parameters['ordered_planets']
 
+    if 'linear_marginalization' in conf_parameters:
+        mc.linear_marginalization = conf_parameters['linear_marginalization']
+
+    if conf_parameters.get('profiling', False):
+        mc.profiler = LikelihoodProfiler()
+
+    if 'dataset_threads' in conf_parameters:
+        mc.dataset_threads = conf_parameters['dataset_threads']
+
     if 'Tref' in conf_parameters:
         mc.Tref = np.asarray(conf_parameters['Tref'])
         for dataset_name in mc.dataset_dict:
@@ -620,6 +635,21 @@ def pars_input(config_in, mc, input_datasets=None, reload_emcee=False, shutdown_
         if 'shutdown_jitter' in conf:
             mc.pyde_parameters['shutdown_jitter'] = np.asarray(conf['shutdown_jitter'], dtype=bool)
 
+        if 'vectorize' in conf:
+            mc.pyde_parameters['vectorize'] = np.asarray(conf['vectorize'], dtype=bool)
+
+        if 'seed' in conf:
+            mc.pyde_parameters['seed'] = int(conf['seed'])
+
+        if 'nsave' in conf:
+            mc.pyde_parameters['nsave'] = np.asarray(conf['nsave'], dtype=np.int64)
+
+        if 'stop_window' in conf:
+            mc.pyde_parameters['stop_window'] = np.asarray(conf['stop_window'], dtype=np.int64)
+
+        if 'stop_tolerance' in conf:
+            mc.pyde_parameters['stop_tolerance'] = np.asarray(conf['stop_tolerance'], dtype=np.double)
+
         if 'include_priors' in conf:
             mc.include_priors = np.asarray(conf['include_priors'], dtype=bool)
 
@@ -650,6 +680,18 @@ def pars_input(config_in, mc, input_datasets=None, reload_emcee=False, shutdown_
         if 'shutdown_jitter' in conf:
             mc.emcee_parameters['shutdown_jitter'] = np.asarray(conf['shutdown_jitter'], dtype=bool)
 
+        if 'vectorize' in conf:
+            mc.emcee_parameters['vectorize'] = np.asarray(conf['vectorize'], dtype=bool)
+
+        if 'nprocesses' in conf:
+            mc.emcee_parameters['nprocesses'] = np.asarray(conf['nprocesses'], dtype=np.int64)
+
+        if 'chunksize' in conf:
+            mc.emcee_parameters['chunksize'] = np.asarray(conf['chunksize'], dtype=np.int64)
+
+        if 'use_hdf5' in conf:
+            mc.emcee_parameters['use_hdf5'] = np.asarray(conf['use_hdf5'], dtype=bool)
+
         if 'include_priors' in conf:
             mc.include_priors = np.asarray(conf['include_priors'], dtype=bool)
 
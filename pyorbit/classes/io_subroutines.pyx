@@ -3,6 +3,7 @@ try:
 except:
     import pickle
 import numpy as np
+import os
 
 
 def pyde_create_dummy_file(mc, prefix=''):
@@ -30,6 +31,29 @@ def pyde_load_from_cpickle(pyde_dir_output, prefix=''):
     return mc, population, starting_point, theta_dict
 
 
+def pyde_save_checkpoint(mc, population, generation, random_state, theta_dict):
+    """ The checkpoint is written to a temporary file and then renamed, so that a run killed while writing
+    does not leave a corrupted checkpoint behind.
+    The order of the parameters in theta may change in a new process, the columns of the population and the
+    bounds are saved together with the theta dictionary to be remapped when the run is resumed """
+    checkpoint = {'population': population,
+                  'generation': generation,
+                  'random_state': random_state,
+                  'theta_dict': theta_dict,
+                  'bounds': mc.bounds}
+    file_checkpoint = mc.pyde_dir_output + "checkpoint.p"
+    with open(file_checkpoint + ".tmp", "wb") as file_output:
+        pickle.dump(checkpoint, file_output)
+    os.replace(file_checkpoint + ".tmp", file_checkpoint)
+
+
+def pyde_load_checkpoint(pyde_dir_output):
+    with open(pyde_dir_output + "checkpoint.p", "rb") as file_input:
+        checkpoint = pickle.load(file_input)
+    return checkpoint['population'], checkpoint['generation'], checkpoint['random_state'], \
+        checkpoint.get('theta_dict', None), checkpoint.get('bounds', None)
+
+
 def emcee_create_dummy_file(mc, prefix=''):
     add_prefix = (prefix + '_' if prefix else '')
     file_dummy = open(mc.emcee_dir_output + add_prefix + "dummy_file", "wb")
@@ -53,9 +77,135 @@ def emcee_save_to_cpickle(mc, starting_point, population, prob, state, sampler,
                 open(mc.emcee_dir_output + add_prefix + "sampler_acceptance_fraction.p", "wb"))
 
 
+def pickle_dump_atomic(obj, file_name):
+    """ The object is written to a temporary file, which then replaces the target file """
+    with open(file_name + ".tmp", "wb") as file_output:
+        pickle.dump(obj, file_output)
+        file_output.flush()
+        os.fsync(file_output.fileno())
+    os.replace(file_name + ".tmp", file_name)
+
+
+def emcee_save_to_hdf5(mc, starting_point, population, prob, state, sampler, theta_dict, samples=None,
+                       chain_offset=0, acceptance_fraction=None):
+    """ Incremental alternative to emcee_save_to_cpickle: only the steps added to the chain after the previous
+    call are appended to sampler_chain.h5, the model container is saved only once.
+
+    The last population, its log-probability, the acceptance fraction and the pickled state of the sampler are
+    written alternately to the checkpoint_0 and checkpoint_1 groups, together with the number of completed
+    steps. The number of saved steps and the group of the last checkpoint are stored in a single attribute,
+    written after everything else has been flushed to disk, while the number of steps of the full run is
+    stored when the file is created. Steps and checkpoints written after the last update of the attribute are
+    ignored when the file is read.
+    This is not an atomic update: resizing and overwriting the datasets modify the HDF5 metadata in place, and a
+    run killed while writing may still leave a file that cannot be read. In that case the chain is started
+    again from the beginning.
+
+    :param chain_offset: number of saved steps already in the file when the sampler has been restarted from a
+        checkpoint, the chain of the sampler contains only the steps performed after the restart
+    :param acceptance_fraction: acceptance fraction of the full chain, if different from the one of the sampler
+    """
+    import h5py
+
+    file_hdf5 = mc.emcee_dir_output + "sampler_chain.h5"
+    if not os.path.exists(file_hdf5):
+        pickle_dump_atomic(theta_dict, mc.emcee_dir_output + "theta_dict.p")
+        pickle_dump_atomic(mc, mc.emcee_dir_output + "model_container.p")
+        pickle_dump_atomic(starting_point, mc.emcee_dir_output + "starting_point.p")
+
+    nsteps_completed = samples if samples else mc.emcee_parameters['nsteps']
+    if acceptance_fraction is None:
+        acceptance_fraction = sampler.acceptance_fraction
+
+    sampler_chain = sampler.chain
+    sampler_lnprobability = sampler.lnprobability
+    n_walkers, n_chain, n_dim = np.shape(sampler_chain)
+    n_chain += chain_offset
+
+    with h5py.File(file_hdf5, "a") as h5_output:
+        if 'committed' not in h5_output.attrs:
+            h5_output.create_dataset('chain', shape=(n_walkers, 0, n_dim), maxshape=(n_walkers, None, n_dim),
+                                     chunks=(n_walkers, 64, n_dim), dtype=np.double)
+            h5_output.create_dataset('lnprobability', shape=(n_walkers, 0), maxshape=(n_walkers, None),
+                                     chunks=(n_walkers, 64), dtype=np.double)
+            for group_name in ['checkpoint_0', 'checkpoint_1']:
+                group = h5_output.create_group(group_name)
+                group.create_dataset('state', shape=(0,), maxshape=(None,), dtype=np.uint8)
+            h5_output.attrs['nsteps'] = mc.emcee_parameters['nsteps']
+            h5_output.attrs['committed'] = np.asarray([0, 1], dtype=np.int64)
+
+        n_saved, checkpoint = h5_output.attrs['committed']
+        checkpoint = 1 - checkpoint
+
+        h5_output['chain'].resize(n_chain, axis=1)
+        h5_output['chain'][:, n_saved:n_chain, :] = sampler_chain[:, n_saved - chain_offset:, :]
+        h5_output['lnprobability'].resize(n_chain, axis=1)
+        h5_output['lnprobability'][:, n_saved:n_chain] = sampler_lnprobability[:, n_saved - chain_offset:]
+
+        group = h5_output['checkpoint_{0:d}'.format(checkpoint)]
+        for data_name, data_values in [('population', population), ('prob', prob),
+                                       ('acceptance_fraction', acceptance_fraction)]:
+            data_values = np.asarray(data_values, dtype=np.double)
+            if data_name not in group:
+                group.create_dataset(data_name, shape=data_values.shape, dtype=np.double)
+            group[data_name][...] = data_values
+
+        state_bytes = np.frombuffer(pickle.dumps(state), dtype=np.uint8)
+        group['state'].resize(len(state_bytes), axis=0)
+        group['state'][:] = state_bytes
+        group.attrs['nsteps'] = nsteps_completed
+        h5_output.flush()
+        os.fsync(h5_output.id.get_vfd_handle())
+
+        h5_output.attrs['committed'] = np.asarray([n_chain, checkpoint], dtype=np.int64)
+        h5_output.flush()
+
+
+def emcee_load_from_hdf5(emcee_dir_output):
+    """ Output of emcee_save_to_hdf5, up to the last completed checkpoint. The number of steps in the
+    emcee_parameters of the model container is replaced by the number of completed steps """
+    import h5py
+
+    theta_dict = pickle.load(open(emcee_dir_output + "theta_dict.p", "rb"))
+    mc = pickle.load(open(emcee_dir_output + "model_container.p", "rb"))
+    starting_point = pickle.load(open(emcee_dir_output + "starting_point.p", "rb"))
+
+    with h5py.File(emcee_dir_output + "sampler_chain.h5", "r") as h5_input:
+        n_saved, checkpoint = h5_input.attrs['committed']
+        sampler_chain = h5_input['chain'][:, :n_saved, :]
+        sampler_lnprobability = h5_input['lnprobability'][:, :n_saved]
+
+        group = h5_input['checkpoint_{0:d}'.format(checkpoint)]
+        population = group['population'][...]
+        prob = group['prob'][...]
+        sampler_acceptance_fraction = group['acceptance_fraction'][...]
+        state = pickle.loads(group['state'][:].tobytes())
+        mc.emcee_parameters['nsteps'] = group.attrs['nsteps']
+
+    return mc, starting_point, population, prob, state, \
+           sampler_chain, sampler_lnprobability, sampler_acceptance_fraction, theta_dict
+
+
+def emcee_hdf5_nsteps(emcee_dir_output):
+    """ Number of steps completed at the last checkpoint of sampler_chain.h5 and number of steps of the full run.
+    Files written before the number of steps of the full run was stored are considered complete """
+    import h5py
+
+    with h5py.File(emcee_dir_output + "sampler_chain.h5", "r") as h5_input:
+        _, checkpoint = h5_input.attrs['committed']
+        nsteps_completed = int(h5_input['checkpoint_{0:d}'.format(checkpoint)].attrs['nsteps'])
+        nsteps = int(h5_input.attrs.get('nsteps', nsteps_completed))
+
+    return nsteps_completed, nsteps
+
+
 def emcee_load_from_cpickle(emcee_dir_output, prefix=''):
     add_prefix = (prefix + '_' if prefix else '')
 
+    """ The chain written by emcee_save_to_hdf5 is read natively """
+    if not prefix and os.path.exists(emcee_dir_output + "sampler_chain.h5"):
+        return emcee_load_from_hdf5(emcee_dir_output)
+
     # For backward compatibility
     try:
         theta_dict = pickle.load(open(emcee_dir_output + add_prefix + "theta_dict.p", "rb"))
@@ -102,6 +252,39 @@ def nested_sampling_save_to_cpickle(mc, prefix=None):
     pickle.dump(mc, open(mc.output_directory + add_prefix + "model_container.p", "wb"))
 
 
+def dynesty_save_to_cpickle(mc, results):
+    """ The posterior samples with equal weights are saved in the same format of the post_equal_weights.dat
+    file of MultiNest, i.e., the parameters followed by the log-likelihood """
+    from dynesty.utils import resample_equal
+
+    pickle.dump(results, open(mc.output_directory + "dynesty_results.p", "wb"))
+
+    weights = np.exp(results.logwt - results.logz[-1])
+    samples_index = resample_equal(np.arange(0, len(weights)), weights / np.sum(weights))
+    np.savetxt(mc.output_directory + "post_equal_weights.dat",
+               np.column_stack([results.samples[samples_index, :], results.logl[samples_index]]))
+
+
+def model_container_load_from_cpickle(output_directory, prefix=''):
+    """ Model container alone, for any sampler, when the chains are read from the posterior store """
+    add_prefix = (prefix + '_' if prefix else '')
+    mc = pickle.load(open(output_directory + add_prefix + "model_container.p", "rb"))
+    return mc
+
+
+def dynesty_save_checkpoint_model(mc, theta_dict):
+    """ Model container and theta dictionary of the process that writes the dynesty checkpoint, the live points
+    in the checkpoint follow the order of the parameters of this model container """
+    pickle_dump_atomic({'model_container': mc, 'theta_dict': theta_dict},
+                       mc.output_directory + "dynesty_checkpoint_model.p")
+
+
+def dynesty_load_checkpoint_model(output_directory):
+    with open(output_directory + "dynesty_checkpoint_model.p", "rb") as file_input:
+        checkpoint_model = pickle.load(file_input)
+    return checkpoint_model['model_container'], checkpoint_model['theta_dict']
+
+
 def nested_sampling_load_from_cpickle(output_directory, prefix=''):
     add_prefix = (prefix + '_' if prefix else '')
     mc = pickle.load(open(output_directory + add_prefix + "model_container.p", "rb"))
@@ -17,106 +17,102 @@ import pyorbit.classes.constants as constants
 __all__ = ["kepler_K1", "kepler_RV", "kepler_Tc2phase_Tref", "kepler_phase2Tc_Tref", "get_planet_mass"]
 
 
-def kepler_E(M_in, ec):
-    E = 0.0
-    E0 = 0.0
-    M = np.atleast_1d(M_in)
-    ecc = np.asarray(ec, dtype=np.double)
-    eccanom = np.zeros(np.size(M), dtype=np.double)
-
-    for ii in range(0, np.size(M)):
-        # -np.pi < M < np.pi
-        mx = M[ii]
-        if mx > np.pi:
-            mx = mx % (2. * np.pi)
-            if mx > np.pi:
-                mx = mx - (2. * np.pi)
-        if mx <= -np.pi:
-            mx = mx % (2. * np.pi)
-            if mx < -np.pi:
-                mx += (2. * np.pi)
-
-        if ecc < 1e-10:
-            eccanom[ii] = mx
-        else:
-
-            # equation 9a
-            aux = 4.0 * ecc + 0.50
-            alpha = (1.0 - ecc) / aux
-            beta = mx / (2.0 * aux)
-
-            # equation 9b
-            ## the actual equation 9b is much much slower, but gives the same
-            ## answer (probably because more refinement necessary)
-            aux = np.sqrt(beta * beta + alpha * alpha * alpha)
-            z = beta + aux
-            if z < 0.:
-                z = beta - aux
-            z = z ** (1. / 3.)
-
-            if abs(z) < 1e-8:
-                s0 = 0.
-            else:
-                s0 = z - alpha / z
-
-            s1 = s0 - (0.078 * s0 ** 5) / ((1.) + ecc)
-            e0 = mx + ecc * (3. * s1 - 4. * s1 ** 3.)
-
-            se0 = np.sin(e0)
-            ce0 = np.cos(e0)
-
-            f = e0 - ecc * se0 - mx
-            f1 = (1.0) - ecc * ce0
-            f2 = ecc * se0
-            f3 = ecc * ce0
-            u1 = -f / f1
-            u2 = -f / (f1 + 0.5 * f2 * u1)
-            u3 = -f / (f1 + 0.5 * f2 * u2 + (1. / 6.) * f3 * u2 ** 2.)
-            u4 = -f / (f1 + 0.5 * f2 * u3 + (1. / 6.) * f3 * u3 ** 2 - (1. / 24.) * f2 * u3 ** 3)
-
-            ecan_tmp = e0 + u4
-
-            if ecan_tmp >= 2. * np.pi:
-                ecan_tmp = ecan_tmp - 2. * np.pi
-
-            if ecan_tmp < 0.:
-                ecan_tmp = ecan_tmp + 2. * np.pi
-
-            ## Now get more precise solution using Newton Raphson method
-            ## for those times when the Kepler equation is not yet solved
-            ## to better than 1e-10
-            ## (modification J. Wilms)
-
-            if mx < 0.:
-                mx = mx + 2. * np.pi
-
-            ## calculate the differences
-            diff = abs(ecan_tmp - ecc * np.sin(ecan_tmp) - mx)
-            if diff > abs(diff - 2 * np.pi):
-                diff = abs(diff - 2 * np.pi)
-
-            thresh1 = 1e-8
-            thresh2 = 10000
-            countt = 0
-
-            while (diff > thresh1 and countt < thresh2):
-                ## E-e sinE-M
-                fe = (ecan_tmp - ecc * np.sin(ecan_tmp) - mx) % (2 * np.pi)
-                ## f' = 1-e*cosE
-                fs = (1. - ecc * np.cos(ecan_tmp)) % (2 * np.pi)
-                oldval = ecan_tmp
-                ecan_tmp = (oldval - fe / fs)
-                diff = abs(oldval - ecan_tmp)
-                countt += 1
-            ## range reduction
-            if ecan_tmp >= 2. * np.pi:
-                ecan_tmp = ecan_tmp % 2. * np.pi
-            if ecan_tmp < 0.:
-                ecan_tmp = ecan_tmp % 2. * np.pi + 2. * np.pi
-
-            eccanom[ii] = ecan_tmp
-
-    return eccanom
+def kepler_E(M_in, ec, tolerance=1e-8, max_iterations=10000):
+    """ Solve Kepler's equation for an array of mean anomalies
+
+    Vectorized version of the Mikkola (1987) + Newton-Raphson solver: the starting values of all the
+    mean anomalies are computed at once, then the Newton-Raphson refinement is applied only to the elements
+    that have not yet converged. Mean anomalies and eccentricities are broadcast against each other,
+    so that the solver can be used with a single eccentricity or with one eccentricity for each element.
+
+    :param M_in: mean anomaly, in radians (scalar or array)
+    :param ec: orbital eccentricity (scalar or array broadcastable against M_in)
+    :param tolerance: convergence threshold on the Kepler equation / Newton-Raphson correction
+    :param max_iterations: maximum number of Newton-Raphson iterations
+    :return: eccentric anomaly, in radians
+    """
+
+    M, ecc = np.broadcast_arrays(np.atleast_1d(np.asarray(M_in, dtype=np.double)),
+                                 np.asarray(ec, dtype=np.double))
+    two_pi = 2. * np.pi
+
+    # -np.pi < M < np.pi
+    M_mod = np.mod(M, two_pi)
+    mx = np.where(M > np.pi,
+                  np.where(M_mod > np.pi, M_mod - two_pi, M_mod),
+                  np.where(M <= -np.pi, M_mod, M))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # equation 9a
+        aux = 4.0 * ecc + 0.50
+        alpha = (1.0 - ecc) / aux
+        beta = mx / (2.0 * aux)
+
+        # equation 9b
+        ## the actual equation 9b is much much slower, but gives the same
+        ## answer (probably because more refinement necessary)
+        aux = np.sqrt(beta * beta + alpha * alpha * alpha)
+        z = beta + aux
+        z = np.where(z < 0., beta - aux, z)
+        z = z ** (1. / 3.)
+
+        s0 = np.where(np.abs(z) < 1e-8, 0., z - alpha / z)
+
+    s1 = s0 - (0.078 * s0 ** 5) / ((1.) + ecc)
+    e0 = mx + ecc * (3. * s1 - 4. * s1 ** 3.)
+
+    se0 = np.sin(e0)
+    ce0 = np.cos(e0)
+
+    f = e0 - ecc * se0 - mx
+    f1 = (1.0) - ecc * ce0
+    f2 = ecc * se0
+    f3 = ecc * ce0
+    u1 = -f / f1
+    u2 = -f / (f1 + 0.5 * f2 * u1)
+    u3 = -f / (f1 + 0.5 * f2 * u2 + (1. / 6.) * f3 * u2 ** 2.)
+    u4 = -f / (f1 + 0.5 * f2 * u3 + (1. / 6.) * f3 * u3 ** 2 - (1. / 24.) * f2 * u3 ** 3)
+
+    ecan = e0 + u4
+    ecan = np.where(ecan >= two_pi, ecan - two_pi, ecan)
+    ecan = np.where(ecan < 0., ecan + two_pi, ecan)
+
+    ## Now get more precise solution using Newton Raphson method
+    ## for those elements where the Kepler equation is not yet solved
+    ## to better than the required tolerance
+    ## (modification J. Wilms)
+    mx_pos = np.where(mx < 0., mx + two_pi, mx)
+
+    ## calculate the differences
+    diff = np.abs(ecan - ecc * np.sin(ecan) - mx_pos)
+    diff = np.minimum(diff, np.abs(diff - two_pi))
+
+    sel = np.flatnonzero((diff > tolerance) & (ecc >= 1e-10))
+
+    if sel.size > 0:
+        ecan = ecan.copy()
+        E_sel = ecan.flat[sel]
+        M_sel = mx_pos.flat[sel]
+        e_sel = ecc.flat[sel]
+        active = np.ones(sel.size, dtype=bool)
+
+        for countt in range(0, max_iterations):
+            ## E-e sinE-M, wrapped in the [-pi, pi) interval
+            fe = np.mod(E_sel[active] - e_sel[active] * np.sin(E_sel[active]) - M_sel[active] + np.pi,
+                        two_pi) - np.pi
+            ## f' = 1-e*cosE
+            fs = 1. - e_sel[active] * np.cos(E_sel[active])
+            delta = fe / fs
+            E_sel[active] -= delta
+
+            active[active] = np.abs(delta) > tolerance
+            if not np.any(active):
+                break
+
+        ## range reduction
+        ecan.flat[sel] = np.mod(E_sel, two_pi)
+
+    return np.where(ecc < 1e-10, mx, ecan)
 
 
 def kepler_K1(m_star1, m_star2, period, i, e0):
@@ -143,24 +139,30 @@ def kepler_RV(BJD, TPeri, Period, gamma, K, e0, omega0):
     # omega = argument of pericenter
     # Mean Anomaly
     #
+    # Orbital parameters can be provided either as scalars or as arrays broadcastable against BJD,
+    # e.g. (n_walkers, 1) column vectors to obtain a (n_walkers, n_epochs) matrix of RVs
     MeAn = 2. * np.pi * (1. + (BJD - TPeri) / Period % 1.)
 
-    if abs(e0) < 1e-3:
+    e0 = np.asarray(e0, dtype=np.double)
+    circular = (np.abs(e0) < 1e-3)
+
+    if np.all(circular):
         TrAn = np.asarray(MeAn, dtype=np.double)
         e = np.asarray(0., dtype=np.double)
         omega = np.asarray(0., dtype=np.double)
     else:
-        if e0 < 0.:
-            e = np.asarray(-e0, dtype=np.double)
-            omega = np.asarray(omega0, dtype=np.double) + np.pi
-        else:
-            e = np.asarray(e0, dtype=np.double)
-            omega = np.asarray(omega0, dtype=np.double)
+        e = np.abs(e0)
+        omega = np.where(e0 < 0., np.asarray(omega0, dtype=np.double) + np.pi, omega0)
 
         # Eccentric Anomaly
         EccAn = kepler_E(MeAn, e)
         TrAn = 2. * np.arctan(np.sqrt((1.0 + e) / (1.0 - e)) * np.tan(EccAn / 2.0))
 
+        if np.any(circular):
+            TrAn = np.where(circular, MeAn, TrAn)
+            e = np.where(circular, 0., e)
+            omega = np.where(circular, 0., omega)
+
     rv = K * (np.cos(TrAn + omega) + e * np.cos(omega)) + gamma
 
     return rv
@@ -172,23 +174,31 @@ def kepler_RV_T0P(BJD0, phase, Period, K, e0, omega0):
     #        BJD0+T0+phase*Period = Tperi
     # omega = argument of pericenter
     #
+    # Orbital parameters can be provided either as scalars or as arrays broadcastable against BJD0,
+    # e.g. (n_walkers, 1) column vectors to obtain a (n_walkers, n_epochs) matrix of RVs
 
     omega = np.asarray(omega0, dtype=np.double)
     e = np.asarray(e0, dtype=np.double)
     MeAn = 2. * np.pi * (1. + ((BJD0 / Period) + (phase - omega0) / (2 * np.pi)) % 1.)
 
-    if abs(e0) < 1e-3:
+    circular = (np.abs(e) < 1e-3)
+
+    if np.all(circular):
         TrAn = np.asarray(MeAn, dtype=np.double)
         e = np.asarray(0., dtype=np.double)
     else:
-        if e0 < 0.:
-            e = -1 * e
-            omega += np.pi
+        omega = np.where(e < 0., omega + np.pi, omega)
+        e = np.abs(e)
 
         # Eccentric Anomaly
         EccAn = kepler_E(MeAn, e)
         TrAn = 2. * np.arctan(np.sqrt((1.0 + e) / (1.0 - e)) * np.tan(EccAn / 2.0))
 
+        if np.any(circular):
+            TrAn = np.where(circular, MeAn, TrAn)
+            e = np.where(circular, 0., e)
+            omega = np.where(circular, np.asarray(omega0, dtype=np.double), omega)
+
     rv = K * (np.cos(TrAn + omega) + e * np.cos(omega))
 
     return rv
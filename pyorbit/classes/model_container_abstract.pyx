@@ -1,8 +1,15 @@
 from pyorbit.classes.common import *
+from multiprocessing.pool import ThreadPool
 
 __all__ = ["ModelContainer"]
 
 
+""" Transformation functions that can be applied to a whole group of parameters at once, by providing
+either an array of indexes or a pair of arrays of indexes """
+parameter_map_single_transformations = (get_var_val, get_var_exp, get_var_log)
+parameter_map_paired_transformations = (get_2var_e, get_2var_sre, get_2var_o, get_2var_c1, get_2var_c2)
+
+
 class ModelContainer(object):
     """
 
@@ -46,6 +53,26 @@ class ModelContainer(object):
 
         self.ordered_planets = {}
 
+        self.execution_plan = None
+
+        """ True after unpickling, when the runtime objects of the models must be rebuilt by model_setup """
+        self.model_setup_required = False
+
+        """ Output of each model for each dataset, together with the values of the parameters used to compute it"""
+        self.model_cache = {}
+
+        """ Opt-in timing of the stages of the likelihood computation, see LikelihoodProfiler"""
+        self.profiler = None
+
+        """ Number of threads for the concurrent evaluation of the datasets, zero to disable"""
+        self.dataset_threads = 0
+        self.dataset_threads_pool = None
+        self.dataset_threads_groups = None
+
+        """ Analytic marginalization of the parameters entering the model linearly"""
+        self.linear_marginalization = False
+        self.linear_marginalization_parameters = []
+
     def model_setup(self):
 
         # Fixing back-compatibility issues within  v8 sub-versions
@@ -71,12 +98,17 @@ class ModelContainer(object):
 
             #self.dynamical_model.prepare(self)
 
+        self.model_setup_required = False
+
     def create_variables_bounds(self):
         # This routine creates the boundary array and at the same time
         # creates a dictionary with the name of the arrays and their
         # positions in bounds/theta array so that they can be accessed
         # without using nested counters
 
+        if getattr(self, 'linear_marginalization', False):
+            self.prepare_linear_marginalization()
+
         self.ndim = 0
         output_lists = {'bounds': [],
                         'spaces': [],
@@ -107,6 +139,17 @@ class ModelContainer(object):
         self.priors = output_lists['priors']
         self.range = self.bounds[:, 1] - self.bounds[:, 0]
 
+        """ Prepared at the first call of the prior transformation of a nested sampler """
+        self.nested_sampling_groups = None
+
+        self.prepare_bounds_check()
+        self.prepare_execution_plan()
+
+    def prepare_nested_sampling_priors(self):
+        """ Transformation from the unit hypercube to the parameter space, required only by the nested samplers """
+        self.nested_sampling_groups = nested_sampling_prior_transform_prepare(self.priors, self.bounds, self.spaces)
+        return self.nested_sampling_groups
+
     def initialize_logchi2(self):
 
         # Second step: define the number of variables and setting up the boundaries
@@ -131,67 +174,537 @@ class ModelContainer(object):
             for model in dataset.models:
                 self.models[model].define_starting_point(self.starting_point, dataset_name)
 
-    def check_bounds(self, theta):
-        for ii in range(0, self.ndim):
-            if not (self.bounds[ii, 0] < theta[ii] < self.bounds[ii, 1]):
-                return False
+    def prepare_bounds_check(self):
+        """ Collect the information required by check_bounds for every planet in the system:
+        transformation and index of period and eccentricity, eccentricity boundaries, the pairs of planets
+        to be checked for overlapping periods and the position of each planet in the ordered list """
 
-        period_storage = []
-        period_storage_ordered = np.zeros(len(self.ordered_planets))
+        self.bounds_check_planets = []
+        planets_ordered_index = []
 
         for model_name, model in self.common_models.items():
-
             if model.model_class == 'planet':
+                if model_name in self.ordered_planets:
+                    planets_ordered_index.append([len(self.bounds_check_planets),
+                                                  self.ordered_planets[model_name]])
 
-                """ Step 1: retrieve the planet period"""
-                period = model.transformation['P'](theta, model.fixed,
-                                               model.variable_index['P'])
+                self.bounds_check_planets.append((model.transformation['P'], model.fixed, model.variable_index['P'],
+                                                  model.transformation['e'], model.fixed, model.variable_index['e'],
+                                                  model.bounds['e'][0], model.bounds['e'][1]))
 
-                """ Step 2: save the all planet periods into a list"""
-                period_storage.extend([period])
+        self.bounds_check_overlap = np.triu_indices(len(self.bounds_check_planets), k=1)
+        self.bounds_check_ordered = np.asarray(planets_ordered_index, dtype=int).reshape(-1, 2)
 
-                """ Step 3: save the period of the planet in the ordered list"""
-                if model_name in self.ordered_planets:
-                    period_storage_ordered[self.ordered_planets[model_name]] = period
-                    # print('    ', model_name, self.ordered_planets[model_name], period_storage_ordered)
-
-                """ Step 4: check if the eccentricity is within the given range"""
-                e = model.transformation['e'](theta,
-                                              model.fixed,
-                                              model.variable_index['e'])
-
-                if not model.bounds['e'][0] <= e < model.bounds['e'][1]:
-                    # print('eccentricity>1')
-                    # print()
-                    return False
-
-        """ Step 5 check for overlapping periods (within 2.5% arbitrarily chosen)"""
-        for i_n, i_v in enumerate(period_storage):
-            if i_n == len(period_storage) - 1: break
-            if np.amin(np.abs(period_storage[i_n + 1:] - i_v)) / i_v < 0.025:
-                # print('overlapping periods  detected')
-                # print()
-                return False
-
-        """ Step 6 check if the planet are ordered"""
-        for i_n, i_v in enumerate(period_storage_ordered):
-
-            if i_n == len(period_storage_ordered) - 1: break
-            if np.amin(period_storage_ordered[i_n + 1:] - i_v) < 0.0:
-                # print('inverted order detected')
-                # print()
-                return False
-
-        return True
+    def check_bounds(self, theta):
+        """ Check if theta is within the boundaries, and if the planets satisfy the constraints on eccentricity,
+        period overlap and ordering
+
+        Args:
+            theta: either a single set of parameters, or a (n_walkers, ndim) array
+        Returns:
+            a boolean, or a boolean array of length n_walkers if theta is a 2-D array
+        """
+
+        if getattr(self, 'bounds_check_planets', None) is None:
+            self.prepare_bounds_check()
+
+        theta_2d = np.atleast_2d(theta)
+        n_pop = np.size(theta_2d, axis=0)
+
+        in_bounds = np.all((self.bounds[:, 0] < theta_2d) & (theta_2d < self.bounds[:, 1]), axis=1)
+
+        if self.bounds_check_planets and np.any(in_bounds):
+
+            period_storage = np.zeros([n_pop, len(self.bounds_check_planets)], dtype=np.double)
+
+            """ Step 1: retrieve the period of all the planets, and check if the eccentricity is within
+            the given range"""
+            for i_pl, (transformation_P, fixed_P, index_P, transformation_e, fixed_e, index_e, e_min, e_max) \
+                    in enumerate(self.bounds_check_planets):
+
+                period_storage[:, i_pl] = transformation_P(theta_2d, fixed_P, index_P)
+                e = transformation_e(theta_2d, fixed_e, index_e)
+                in_bounds &= (e_min <= e) & (e < e_max)
+
+            """ Step 2: check for overlapping periods (within 2.5% arbitrarily chosen)"""
+            i_pl, j_pl = self.bounds_check_overlap
+            if np.size(i_pl) > 0:
+                period_overlap = np.abs(period_storage[:, j_pl] - period_storage[:, i_pl]) / period_storage[:, i_pl]
+                in_bounds &= ~np.any(period_overlap < 0.025, axis=1)
+
+            """ Step 3: check if the planets are ordered"""
+            if np.size(self.bounds_check_ordered) > 0:
+                period_storage_ordered = np.zeros([n_pop, len(self.ordered_planets)], dtype=np.double)
+                period_storage_ordered[:, self.bounds_check_ordered[:, 1]] = \
+                    period_storage[:, self.bounds_check_ordered[:, 0]]
+                in_bounds &= ~np.any(np.diff(period_storage_ordered, axis=1) < 0.0, axis=1)
+
+        if np.ndim(theta) == 1:
+            return bool(in_bounds[0])
+        return in_bounds
+
+    def __getstate__(self):
+        """ The cached model outputs and the pool of threads are not carried along when the object is pickled.
+        The runtime objects of the models (see AbstractModel.runtime_attributes) are not pickled either, so that
+        the pickled container holds only the configuration, the data, the bounds, the priors and the index maps.
+        The unpickled copy calls model_setup before the first computation of the likelihood """
+        state = self.__dict__.copy()
+        state['model_cache'] = {}
+        state['dataset_threads_pool'] = None
+        state['model_setup_required'] = any(model.runtime_attributes for model in self.models.values())
+        return state
+
+    def __setstate__(self, state):
+        """ Containers pickled by previous versions do not have the model cache """
+        self.__dict__.update(state)
+        if getattr(self, 'model_cache', None) is None:
+            self.model_cache = {}
 
     def __call__(self, theta, include_priors=True):
-        log_priors, log_likelihood = self.log_priors_likelihood(theta)
+        """ A 2-D theta (one row for each walker) is evaluated in a single call,
+        and an array of log-probabilities is given back """
+        if np.ndim(theta) == 2:
+            log_priors, log_likelihood = self.log_priors_likelihood_batch(theta)
+        else:
+            log_priors, log_likelihood = self.log_priors_likelihood(theta)
 
         if self.include_priors and include_priors:
             return log_priors + log_likelihood
         else:
             return log_likelihood
 
+    def prepare_execution_plan(self):
+        """ Flat list of the operations required to compute the log-likelihood
+
+        The association between datasets and models, the role of each model in the construction of the
+        final model (jitter, unitary, normalization or additive model, or Gaussian Process), and the
+        transformation and index of each parameter in theta are resolved here once, so that
+        log_priors_likelihood does not need to go through the dictionaries and the flags of the models at
+        every call.
+        The physical parameters are computed from theta in a single pass by compute_parameter_map,
+        models and datasets receive the values stored in their own positions (slots) of the output vector.
+        The priors of common models, datasets and models are grouped according to their kind, and they
+        are computed with a single call of giveback_priors_compute on the same vector.
+        model_slots are the positions of the parameters of a model in the vector of physical parameters,
+        they are used to skip the computation of a model when none of its parameters has changed since
+        the previous call (see model_cache_compute)
+        Each element of the plan refers to a dataset, and it is a tuple with:
+            dataset_name, dataset,
+            dataset_variables: list of (var, slot) for the dataset parameters,
+            model_steps: list of (model, model_variables, model_target, model_slots),
+            gp_step: None or (model_name, model, model_variables, delayed),
+            use_external_model: True if the output of the dynamical model must be included,
+            compute_likelihood: False for datasets without models (they contribute only with priors),
+            linear_steps: None, or the parameters of the dataset that are marginalized analytically
+                (see prepare_linear_marginalization)
+        """
+
+        self.execution_plan = []
+        self.model_cache = {}
+        self.dataset_threads_groups = None
+        self.parameter_map_slots = {}
+        self.parameter_map_variables = []
+        prior_list = []
+
+        for model_name, common_model in self.common_models.items():
+            for var, slot in self.plan_variables(common_model.transformation,
+                                                 common_model.fixed,
+                                                 common_model.variable_index):
+                prior_list.append([slot, common_model.prior_kind[var], common_model.bounds[var],
+                                   common_model.prior_pams[var]])
+
+        for dataset_name, dataset in self.dataset_dict.items():
+
+            dataset_variables = self.plan_variables(dataset.transformation,
+                                                    dataset.fixed,
+                                                    dataset.variable_index)
+
+            for var, slot in dataset_variables:
+                prior_list.append([slot, dataset.prior_kind[var], dataset.bounds[var], dataset.prior_pams[var]])
+
+            if 'none' in dataset.models or 'None' in dataset.models or not dataset.models:
+                self.execution_plan.append((dataset_name, dataset, dataset_variables, [], None, False, False, None))
+                continue
+
+            model_steps = []
+            gp_step = None
+            use_external_model = False
+
+            for model_name in dataset.models:
+
+                model = self.models[model_name]
+
+                model_variables = []
+                for common_ref in model.common_ref:
+                    common_model = self.common_models[common_ref]
+                    model_variables.extend(self.plan_variables(common_model.transformation,
+                                                               common_model.fixed,
+                                                               common_model.variable_index))
+
+                dataset_model_variables = self.plan_variables(model.transformation[dataset_name],
+                                                              model.fixed,
+                                                              model.variable_index[dataset_name])
+                model_variables.extend(dataset_model_variables)
+
+                for var, slot in dataset_model_variables:
+                    if var in model.list_pams_dataset:
+                        prior_list.append([slot, model.prior_kind[dataset_name][var],
+                                           model.bounds[dataset_name][var], model.prior_pams[dataset_name][var]])
+
+                model_target = self.model_target(model)
+
+                if model_target == 'gp':
+                    gp_step = (model_name, model, model_variables, hasattr(model, 'delayed_lnlk_computation'))
+                    continue
+
+                if model_target != 'jitter' and getattr(dataset, 'dynamical', False):
+                    use_external_model = True
+
+                model_slots = np.asarray([slot for var, slot in model_variables], dtype=int)
+                model_steps.append((model, model_variables, model_target, model_slots))
+
+            self.execution_plan.append((dataset_name, dataset, dataset_variables, model_steps,
+                                        gp_step, use_external_model, True, None))
+
+        if getattr(self, 'linear_marginalization_parameters', None):
+            self.prepare_linear_marginalization_steps()
+
+        self.prepare_parameter_map()
+        self.priors_constant, self.priors_groups = giveback_priors_prepare(prior_list)
+
+    @staticmethod
+    def model_target(model):
+        """ Role of the model in the construction of the final model of a dataset """
+        if getattr(model, 'internal_likelihood', False):
+            return 'gp'
+        if getattr(model, 'jitter_model', False):
+            return 'jitter'
+        if getattr(model, 'unitary_model', False):
+            return 'unitary'
+        if getattr(model, 'normalization_model', False):
+            return 'normalization'
+        return 'additive'
+
+    def prepare_linear_marginalization(self):
+        """ Select the parameters that can be marginalized analytically, i.e., parameters entering the model
+        linearly (dataset offsets, models declaring them in linear_parameters) sampled in the Linear space
+        with either Uniform or Gaussian priors.
+        A parameter is selected only if every model using it is an additive model, and none of the datasets
+        involved is modelled with a Gaussian Process.
+        The selected parameters are fixed to zero, so that they are removed from theta, and their
+        contribution is recovered at each call of the likelihood by weighted linear least squares.
+        Each element of linear_marginalization_parameters is a list with:
+            name, owner kind ('common', 'dataset' or 'model'), owner name, dataset name, var,
+            prior kind, prior parameters, bounds
+        """
+
+        if self.linear_marginalization_parameters:
+            return
+
+        candidates = {}
+        excluded = set()
+
+        for dataset_name, dataset in self.dataset_dict.items():
+
+            if 'none' in dataset.models or 'None' in dataset.models or not dataset.models:
+                continue
+
+            dataset_gp = any(self.model_target(self.models[model_name]) == 'gp' for model_name in dataset.models)
+
+            for var in dataset.list_pams:
+                if dataset.variable_expanded[var] not in ['offset', 'linear']:
+                    continue
+                key = ('dataset', dataset_name, None, var)
+                candidates[key] = dataset_name + '_' + var
+                if dataset_gp:
+                    excluded.add(key)
+
+            for model_name in dataset.models:
+                model = self.models[model_name]
+                model_linear = not dataset_gp and self.model_target(model) == 'additive'
+
+                for common_ref in model.common_ref:
+                    for var in set(model.list_pams_common) & set(self.common_models[common_ref].list_pams):
+                        key = ('common', common_ref, None, var)
+                        candidates[key] = common_ref + '_' + var
+                        if not (model_linear and var in model.linear_parameters):
+                            excluded.add(key)
+
+                for var in model.list_pams_dataset:
+                    key = ('model', model_name, dataset_name, var)
+                    candidates[key] = dataset_name + '_' + model_name + '_' + var
+                    if not (model_linear and var in model.linear_parameters):
+                        excluded.add(key)
+
+        for key, name in candidates.items():
+            if key in excluded:
+                continue
+
+            owner_kind, owner_name, dataset_name, var = key
+            if owner_kind == 'common':
+                owner = self.common_models[owner_name]
+                fix_list, spaces, bounds, prior_kind, prior_pams = \
+                    owner.fix_list, owner.spaces, owner.bounds, owner.prior_kind, owner.prior_pams
+            elif owner_kind == 'dataset':
+                owner = self.dataset_dict[owner_name]
+                fix_list, spaces, bounds, prior_kind, prior_pams = \
+                    owner.fix_list, owner.spaces, owner.bounds, owner.prior_kind, owner.prior_pams
+            else:
+                owner = self.models[owner_name]
+                fix_list = owner.fix_list.setdefault(dataset_name, {})
+                spaces = owner.spaces.get(dataset_name, {})
+                bounds = owner.bounds.get(dataset_name, {})
+                prior_kind = owner.prior_kind.get(dataset_name, {})
+                prior_pams = owner.prior_pams.get(dataset_name, {})
+
+            try:
+                var_bounds = bounds[var] if var in bounds else owner.default_bounds[var]
+                var_space = spaces[var] if var in spaces else owner.default_spaces[var]
+                if var in prior_pams:
+                    var_prior = [prior_kind[var], prior_pams[var]]
+                else:
+                    var_prior = owner.default_priors[var]
+            except KeyError:
+                continue
+
+            if var in fix_list or var_space != 'Linear' or var_prior[0] not in ['Uniform', 'Gaussian']:
+                continue
+
+            fix_list[var] = np.asarray([0.0000, 0.0000], dtype=np.double)
+            self.linear_marginalization_parameters.append([name, owner_kind, owner_name, dataset_name, var,
+                                                           var_prior[0], var_prior[1], var_bounds])
+
+        print()
+        print('Analytic marginalization of linear parameters: ')
+        for name, owner_kind, owner_name, dataset_name, var, kind, pams, bounds in \
+                self.linear_marginalization_parameters:
+            print('    {0:30s} prior: {1:s}'.format(name, kind))
+        print()
+
+    def linear_marginalization_owner(self, owner_kind, owner_name, dataset_name):
+        """ Transformation functions, fixed array and parameter indexes of the object storing a marginalized
+        parameter"""
+        if owner_kind == 'common':
+            owner = self.common_models[owner_name]
+            return owner.transformation, owner.fixed, owner.variable_index
+        elif owner_kind == 'dataset':
+            owner = self.dataset_dict[owner_name]
+            return owner.transformation, owner.fixed, owner.variable_index
+        else:
+            owner = self.models[owner_name]
+            return owner.transformation[dataset_name], owner.fixed, owner.variable_index[dataset_name]
+
+    def prepare_linear_marginalization_steps(self):
+        """ Associate each marginalized parameter to its slot in the vector of physical parameters, and add to
+        the execution plan the information required to compute the design matrix of each dataset:
+            dataset_linear: list of (parameter index, basis) for dataset offsets, the basis is constant
+            model_linear: list of (parameter index, model step index, slot), the basis is computed at each
+                call as the difference between the output of the model with the parameter set to one and
+                the output with the parameter set to zero
+        The constant terms of the priors are precomputed as well, Gaussian priors are normalized
+        """
+
+        slot_index = {}
+        n_linear = len(self.linear_marginalization_parameters)
+        self.linear_marginalization_slots = np.zeros(n_linear, dtype=int)
+        self.linear_marginalization_mean = np.zeros(n_linear, dtype=np.double)
+        self.linear_marginalization_precision = np.zeros(n_linear, dtype=np.double)
+        self.linear_marginalization_constant = n_linear / 2. * np.log(2 * np.pi)
+
+        for i_lin, (name, owner_kind, owner_name, dataset_name, var, kind, pams, bounds) in \
+                enumerate(self.linear_marginalization_parameters):
+
+            transformation, fixed, variable_index = \
+                self.linear_marginalization_owner(owner_kind, owner_name, dataset_name)
+            slot = self.plan_variables(transformation, fixed, {var: variable_index[var]})[0][1]
+            slot_index[slot] = i_lin
+            self.linear_marginalization_slots[i_lin] = slot
+
+            if kind == 'Gaussian':
+                self.linear_marginalization_mean[i_lin] = pams[0]
+                self.linear_marginalization_precision[i_lin] = 1. / pams[1] ** 2
+                self.linear_marginalization_constant -= 0.5 * pams[0] ** 2 / pams[1] ** 2 \
+                    + 0.5 * np.log(2 * np.pi * pams[1] ** 2)
+            else:
+                self.linear_marginalization_constant -= np.log(bounds[1] - bounds[0])
+
+        for i_plan, (dataset_name, dataset, dataset_variables, model_steps, gp_step, use_external_model,
+                     compute_likelihood, linear_steps) in enumerate(self.execution_plan):
+
+            dataset_linear = []
+            for var, slot in dataset_variables:
+                if slot in slot_index:
+                    dataset_linear.append((slot_index[slot], np.asarray(dataset.mask[var], dtype=np.double)))
+
+            model_linear = []
+            for i_step, (model, model_variables, model_target, model_slots) in enumerate(model_steps):
+                for var, slot in model_variables:
+                    if slot in slot_index:
+                        model_linear.append((slot_index[slot], i_step, slot))
+
+            if dataset_linear or model_linear:
+                self.execution_plan[i_plan] = (dataset_name, dataset, dataset_variables, model_steps, gp_step,
+                                               use_external_model, compute_likelihood,
+                                               (dataset_linear, model_linear))
+
+    def linear_marginalization_accumulate(self, parameters, dataset, model_steps, linear_steps, step_outputs,
+                                          normal_matrix, normal_vector):
+        """ Add the contribution of a dataset to the normal equations of the weighted linear least squares
+        problem, using the residuals computed with the marginalized parameters set to zero """
+
+        dataset_linear, model_linear = linear_steps
+        basis = {}
+
+        for i_lin, dataset_basis in dataset_linear:
+            basis[i_lin] = basis.get(i_lin, 0.) + dataset_basis
+
+        for i_lin, i_step, slot in model_linear:
+            model, model_variables, model_target, model_slots = model_steps[i_step]
+            parameters_unit = parameters.copy()
+            parameters_unit[..., slot] = 1.
+            variable_values = self.plan_convert(parameters_unit, model_variables)
+            if np.ndim(parameters) == 1:
+                model_unit = model.compute(variable_values, dataset)
+            else:
+                model_unit = self.population_compute(model, variable_values, dataset, np.size(parameters, axis=0))
+            basis[i_lin] = basis.get(i_lin, 0.) + (model_unit - step_outputs[i_step])
+
+        index = np.asarray(list(basis.keys()), dtype=int)
+        design = np.stack(np.broadcast_arrays(dataset.residuals, *basis.values())[1:], axis=-1)
+        weighted_design = design / (dataset.model_workspace['e2'] + dataset.jitter ** 2)[..., None]
+
+        normal_matrix[..., index[:, None], index[None, :]] += \
+            np.einsum('...ni,...nj->...ij', weighted_design, design)
+        normal_vector[..., index] += np.einsum('...ni,...n->...i', weighted_design, dataset.residuals)
+
+    def linear_marginalization_solve(self, normal_matrix, normal_vector):
+        """ Log-likelihood term from the analytic marginalization of the linear parameters, and the
+        precision matrix and mean of their conditional posterior """
+
+        precision_matrix = normal_matrix + np.diag(self.linear_marginalization_precision)
+        precision_vector = normal_vector + self.linear_marginalization_precision * self.linear_marginalization_mean
+
+        if np.ndim(precision_matrix) == 3:
+            """ Walkers with a singular design matrix are rejected one by one """
+            log_likelihood = np.zeros(np.size(precision_matrix, axis=0), dtype=np.double)
+            mean = np.zeros(np.shape(precision_vector), dtype=np.double)
+            for i_pop in range(0, np.size(precision_matrix, axis=0)):
+                log_likelihood[i_pop], mean[i_pop, :] = self.linear_marginalization_solve(
+                    normal_matrix[i_pop, :, :], normal_vector[i_pop, :])[:2]
+            return log_likelihood, mean, precision_matrix
+
+        try:
+            cholesky = np.linalg.cholesky(precision_matrix)
+        except np.linalg.LinAlgError:
+            return -np.inf, np.zeros(np.shape(precision_vector)), precision_matrix
+
+        mean = np.linalg.solve(precision_matrix, precision_vector)
+        log_likelihood = self.linear_marginalization_constant + 0.5 * np.dot(precision_vector, mean) \
+            - np.sum(np.log(np.diagonal(cholesky)))
+        return log_likelihood, mean, precision_matrix
+
+    def linear_marginalization_posterior(self, theta):
+        """ Mean and covariance matrix of the marginalized linear parameters, conditional on theta
+
+        Args:
+            theta: set of parameters from the sampler
+        Returns:
+            mean, covariance: None, None if theta is outside the boundaries
+        """
+        self.linear_marginalization_status = None
+        self.log_priors_likelihood(theta)
+        if self.linear_marginalization_status is None:
+            return None, None
+        mean, precision_matrix = self.linear_marginalization_status
+        return mean, np.linalg.inv(precision_matrix)
+
+    def linear_marginalization_set_values(self, values=None):
+        """ Replace the null values of the marginalized parameters with the provided ones (e.g., the mean of the
+        conditional posterior), to compute the full model. Null values are restored when values is None """
+
+        for i_lin, (name, owner_kind, owner_name, dataset_name, var, kind, pams, bounds) in \
+                enumerate(self.linear_marginalization_parameters):
+            transformation, fixed, variable_index = \
+                self.linear_marginalization_owner(owner_kind, owner_name, dataset_name)
+            value = 0.0000 if values is None else values[i_lin]
+            fixed[variable_index[var]] = value
+            self.parameter_map_fixed[self.linear_marginalization_slots[i_lin]] = value
+
+    def plan_variables(self, transformation, fixed, variable_index):
+        """ Assign a slot in the vector of physical parameters to each parameter, the same slot is shared by
+        every model using the same parameter (i.e. same transformation and same index in theta or in the
+        fixed array)"""
+        variables = []
+        for var, index in variable_index.items():
+            if transformation[var] is get_fix_val:
+                key = (get_fix_val, id(fixed), index)
+            else:
+                key = (transformation[var], tuple(np.atleast_1d(index)))
+
+            if key not in self.parameter_map_slots:
+                self.parameter_map_slots[key] = len(self.parameter_map_variables)
+                self.parameter_map_variables.append((transformation[var], fixed, index))
+            variables.append((var, self.parameter_map_slots[key]))
+        return variables
+
+    def prepare_parameter_map(self):
+        """ Group the parameters according to their transformation, so that all the parameters sharing
+        the same transformation are computed with a single call on an array of indexes.
+        Fixed parameters are stored once and for all in parameter_map_fixed.
+        Transformations that do not support arrays of indexes are computed one parameter at a time"""
+
+        n_slots = len(self.parameter_map_variables)
+        self.parameter_map_fixed = np.zeros(n_slots, dtype=np.double)
+        self.parameter_map_groups = []
+        self.parameter_map_others = []
+
+        groups = {}
+        for slot, (transformation, fixed, index) in enumerate(self.parameter_map_variables):
+            if transformation is get_fix_val:
+                self.parameter_map_fixed[slot] = get_fix_val(None, fixed, index)
+            elif transformation in parameter_map_single_transformations \
+                    or transformation in parameter_map_paired_transformations:
+                groups.setdefault(transformation, [[], []])
+                groups[transformation][0].append(slot)
+                groups[transformation][1].append(index)
+            else:
+                self.parameter_map_others.append((slot, transformation, fixed, index))
+
+        for transformation, (slots, indexes) in groups.items():
+            if transformation in parameter_map_paired_transformations:
+                indexes = np.asarray(indexes, dtype=int)
+                indexes = [indexes[:, 0], indexes[:, 1]]
+            else:
+                indexes = np.asarray(indexes, dtype=int)
+            self.parameter_map_groups.append((transformation, np.asarray(slots, dtype=int), indexes))
+
+        """ Not required anymore once the map has been compiled """
+        self.parameter_map_slots = {}
+
+    def compute_parameter_map(self, theta):
+        """ Vector of physical parameters for theta, a (n_walkers, n_slots) matrix if theta is a 2-D array """
+        if np.ndim(theta) == 1:
+            parameters = self.parameter_map_fixed.copy()
+        else:
+            parameters = np.tile(self.parameter_map_fixed, (np.size(theta, axis=0), 1))
+
+        for transformation, slots, indexes in self.parameter_map_groups:
+            parameters[..., slots] = transformation(theta, None, indexes)
+
+        for slot, transformation, fixed, index in self.parameter_map_others:
+            parameters[..., slot] = transformation(theta, fixed, index)
+
+        return parameters
+
+    @staticmethod
+    def plan_convert(parameters, variables):
+        """ Equivalent to the convert method of models and datasets, reading the physical parameters from
+        the output of compute_parameter_map"""
+        if np.ndim(parameters) == 1:
+            return {var: parameters[slot] for var, slot in variables}
+        else:
+            return {var: parameters[:, slot] for var, slot in variables}
+
     def log_priors_likelihood(self, theta, return_priors=True):
 
         log_priors = 0.00
@@ -201,117 +714,447 @@ class ModelContainer(object):
         Constant term added either by dataset.model_logchi2() or gp.log_likelihood()
         """
 
+        profiler = getattr(self, 'profiler', None)
+        if profiler:
+            profiler.start()
+
         if not self.check_bounds(theta):
+            if profiler:
+                profiler.lap('bounds')
             if return_priors is False:
                 return -np.inf
             else:
                 return -np.inf, -np.inf
 
+        if getattr(self, 'model_setup_required', False):
+            self.model_setup()
+
+        if getattr(self, 'execution_plan', None) is None:
+            self.prepare_execution_plan()
+
+        if profiler:
+            profiler.lap('bounds')
+
+        parameters = self.compute_parameter_map(theta)
+
+        if profiler:
+            profiler.lap('convert')
+
+        dynamical_output = None
         if self.dynamical_model is not None:
             """ check if any keyword ahas get the output model from the dynamical tool
             we must do it here because all the planet are involved"""
             dynamical_output = self.dynamical_model.compute(self, theta)
+            if profiler:
+                profiler.lap('dynamical')
 
-        for model_name, model in self.common_models.items():
-            log_priors += model.return_priors(theta)
+        log_priors += giveback_priors_compute(self.priors_constant, self.priors_groups, parameters)
+
+        if profiler:
+            profiler.lap('priors')
 
         delayed_lnlk_computation = []
 
-        for dataset_name, dataset in self.dataset_dict.items():
+        if getattr(self, 'linear_marginalization_parameters', None):
+            n_linear = len(self.linear_marginalization_parameters)
+            normal_matrix = np.zeros([n_linear, n_linear], dtype=np.double)
+            normal_vector = np.zeros(n_linear, dtype=np.double)
+        else:
+            normal_matrix, normal_vector = None, None
 
-            logchi2_gp_model = None
+        if getattr(self, 'dataset_threads', 0):
+            dataset_outputs = self.dataset_threads_compute(parameters, dynamical_output, normal_matrix, normal_vector)
+            if profiler:
+                profiler.lap('datasets')
+        else:
+            dataset_outputs = [self.dataset_log_likelihood(parameters, plan_step, dynamical_output,
+                                                           normal_matrix, normal_vector, profiler)
+                               for plan_step in self.execution_plan]
 
-            dataset.model_reset()
-            variable_values = dataset.convert(theta)
-            dataset.compute(variable_values)
+        for dataset_log_likelihood, delayed_gp in dataset_outputs:
+            log_likelihood += dataset_log_likelihood
 
-            log_priors += dataset.return_priors(theta)
+            """ GP Log-likelihood is not computed now because a single matrix must be created with 
+            the joined dataset"""
+            if delayed_gp:
+                dataset_name, dataset, logchi2_gp_model, model, variable_values = delayed_gp
+                model.add_internal_dataset(variable_values, dataset, reset_status=delayed_lnlk_computation)
+                delayed_lnlk_computation.append(logchi2_gp_model)
 
-            if 'none' in dataset.models or 'None' in dataset.models:
-                continue
-            if not dataset.models:
-                continue
+                if profiler:
+                    profiler.lap('gp', dataset_name, logchi2_gp_model)
 
-            for model_name in dataset.models:
+        """ In case there is more than one GP model"""
+        for logchi2_gp_model in delayed_lnlk_computation:
+            log_likelihood += self.models[logchi2_gp_model].lnlk_compute()
+            if profiler:
+                profiler.lap('gp', None, logchi2_gp_model)
 
-                log_priors += self.models[model_name].return_priors(theta, dataset_name)
+        if getattr(self, 'linear_marginalization_parameters', None):
+            log_marginalization, mean, precision_matrix = \
+                self.linear_marginalization_solve(normal_matrix, normal_vector)
+            log_likelihood += log_marginalization
+            self.linear_marginalization_status = (mean, precision_matrix)
+            if profiler:
+                profiler.lap('linear_marginalization')
 
-                variable_values = {}
-                for common_ref in self.models[model_name].common_ref:
-                    variable_values.update(self.common_models[common_ref].convert(theta))
+        if return_priors is False:
+            return log_likelihood
+        else:
+            return log_priors, log_likelihood
 
-                #try:
-                #    """ Taking the parameter values from the common models"""
-                #    for common_ref in self.models[model_name].common_ref:
-                #        variable_values.update(self.common_models[common_ref].convert(theta))
-                #except:
-                #    """ This model has no common model reference, i.e., it is strictly connected to the dataset"""
-                #    pass
+    def dataset_log_likelihood(self, parameters, plan_step, dynamical_output, normal_matrix, normal_vector,
+                               profiler=None):
+        """ Log-likelihood of a single dataset, following one step of the execution plan
 
-                variable_values.update(self.models[model_name].convert(theta, dataset_name))
+        Returns:
+            log_likelihood: contribution of the dataset
+            delayed_gp: None, or (dataset_name, dataset, model_name, model, variable_values) when the dataset
+                must be added to a GP model shared by several datasets
+        """
 
-                """ residuals will be computed following the definition in Dataset class
-                """
+        dataset_name, dataset, dataset_variables, model_steps, gp_step, \
+            use_external_model, compute_likelihood, linear_steps = plan_step
 
-                if getattr(self.models[model_name], 'internal_likelihood', False):
-                    logchi2_gp_model = model_name
-                    continue
+        dataset.model_reset()
+        dataset.compute(self.plan_convert(parameters, dataset_variables))
 
-                #if getattr(self.models[model_name], 'model_class', None) is 'common_jitter':
-                if getattr(self.models[model_name], 'jitter_model', False):
-                    dataset.jitter += self.models[model_name].compute(variable_values, dataset)
-                    continue
+        if profiler:
+            profiler.lap('systematics', dataset_name)
 
-                if getattr(dataset, 'dynamical', False):
-                    dataset.external_model = dynamical_output[dataset_name]
+        if not compute_likelihood:
+            return 0.0000, None
 
-                if getattr(self.models[model_name], 'unitary_model', False):
-                    dataset.unitary_model += self.models[model_name].compute(variable_values, dataset)
-                    if dataset.normalization_model is None:
-                        dataset.normalization_model = np.ones(dataset.n, dtype=np.double)
+        if use_external_model:
+            dataset.external_model = dynamical_output[dataset_name]
+
+        step_outputs = []
+        for model, model_variables, model_target, model_slots in model_steps:
+
+            """ residuals will be computed following the definition in Dataset class
+            """
+            model_output = self.model_cache_compute(parameters, dataset_name, dataset,
+                                                    model, model_variables, model_slots)
+            if linear_steps:
+                step_outputs.append(np.array(model_output, dtype=np.double))
+
+            if model_target == 'jitter':
+                dataset.jitter += model_output
+            elif model_target == 'additive':
+                dataset.additive_model += model_output
+            elif model_target == 'unitary':
+                dataset.unitary_model += model_output
+                if dataset.normalization_model is None:
+                    dataset.initialize_normalization_model()
+            else:
+                if dataset.normalization_model is None:
+                    dataset.initialize_normalization_model()
+                dataset.normalization_model *= model_output
+
+            if profiler:
+                profiler.lap('compute', dataset_name, model.model_name)
+
+        dataset.compute_model()
+        dataset.compute_residuals()
+
+        if profiler:
+            profiler.lap('residuals', dataset_name)
+
+        """ Gaussian Process check MUST be the last one or the program will fail
+         that's because for the GP to work we need to know the _deterministic_ part of the model 
+         (i.e. the theoretical values you get when you feed your model with the parameter values) """
+        if gp_step:
+            logchi2_gp_model, model, model_variables, delayed = gp_step
+            variable_values = self.plan_convert(parameters, model_variables)
+
+            if delayed:
+                return 0.0000, (dataset_name, dataset, logchi2_gp_model, model, variable_values)
+
+            log_likelihood = model.lnlk_compute(variable_values, dataset)
+
+            if profiler:
+                profiler.lap('gp', dataset_name, logchi2_gp_model)
+            return log_likelihood, None
+
+        if linear_steps:
+            self.linear_marginalization_accumulate(parameters, dataset, model_steps, linear_steps,
+                                                   step_outputs, normal_matrix, normal_vector)
+            if profiler:
+                profiler.lap('linear_marginalization', dataset_name)
+
+        log_likelihood = dataset.model_logchi2()
+
+        if profiler:
+            profiler.lap('logchi2', dataset_name)
+        return log_likelihood, None
+
+    def prepare_dataset_threads(self):
+        """ Datasets sharing a model that cannot be computed concurrently on different datasets
+        (thread_safe=False) are assigned to the same group, each group is evaluated by a single thread.
+        Each group is a list of indexes of the execution plan """
+
+        groups = []
+        for i_plan, plan_step in enumerate(self.execution_plan):
+            unsafe_models = set(id(model) for model, model_variables, model_target, model_slots in plan_step[3]
+                                if not model.thread_safe)
+            group = [unsafe_models, [i_plan]]
+            for merged_group in [g for g in groups if g[0] & unsafe_models]:
+                group[0] |= merged_group[0]
+                group[1] = merged_group[1] + group[1]
+                groups.remove(merged_group)
+            groups.append(group)
+
+        self.dataset_threads_groups = [sorted(group[1]) for group in groups]
+
+    def dataset_threads_compute(self, parameters, dynamical_output, normal_matrix, normal_vector):
+        """ Datasets are evaluated concurrently by a persistent pool of threads, taking advantage of the
+        libraries releasing the GIL (NumPy, batman, george, celerite). The contributions to the normal
+        equations of the linear marginalization are computed separately by each thread and summed at the end.
+        Returns the outputs of dataset_log_likelihood, in the order of the execution plan"""
+
+        if getattr(self, 'dataset_threads_pool', None) is None:
+            self.dataset_threads_pool = ThreadPool(int(self.dataset_threads))
+        if self.dataset_threads_groups is None:
+            self.prepare_dataset_threads()
+
+        def compute_group(group):
+            if normal_matrix is None:
+                group_matrix, group_vector = None, None
+            else:
+                group_matrix, group_vector = np.zeros_like(normal_matrix), np.zeros_like(normal_vector)
+
+            group_outputs = [(i_plan, self.dataset_log_likelihood(parameters, self.execution_plan[i_plan],
+                                                                  dynamical_output, group_matrix, group_vector))
+                             for i_plan in group]
+            return group_outputs, group_matrix, group_vector
+
+        dataset_outputs = [None] * len(self.execution_plan)
+        for group_outputs, group_matrix, group_vector in \
+                self.dataset_threads_pool.map(compute_group, self.dataset_threads_groups):
+            for i_plan, output in group_outputs:
+                dataset_outputs[i_plan] = output
+            if normal_matrix is not None:
+                normal_matrix += group_matrix
+                normal_vector += group_vector
+
+        return dataset_outputs
+
+    def log_priors_likelihood_batch(self, thetas, return_priors=True):
+        """ Log-priors and log-likelihoods of a population of walkers
+
+        Models flagged with population_compute are computed for all the walkers at once, the other ones are
+        computed row by row and stacked into a (n_walkers, n_epochs) matrix. Gaussian Processes are
+        always evaluated one walker at a time.
+        When a dynamical model is present, the computation falls back to log_priors_likelihood for each row.
+
+        Args:
+            thetas: (n_walkers, ndim) array
+            return_priors: if False, only the log-likelihoods are given back
+        Returns:
+            log_priors, log_likelihood: arrays of length n_walkers
+        """
 
-                elif getattr(self.models[model_name], 'normalization_model', False):
+        thetas = np.atleast_2d(thetas)
+        n_walkers = np.size(thetas, axis=0)
+
+        profiler = getattr(self, 'profiler', None)
+        if profiler:
+            profiler.start()
+
+        log_priors = np.zeros(n_walkers, dtype=np.double)
+        log_likelihood = np.zeros(n_walkers, dtype=np.double)
+
+        if self.dynamical_model is not None:
+            for i_walker in range(0, n_walkers):
+                log_priors[i_walker], log_likelihood[i_walker] = self.log_priors_likelihood(thetas[i_walker, :])
+
+            if return_priors is False:
+                return log_likelihood
+            else:
+                return log_priors, log_likelihood
+
+        in_bounds = self.check_bounds(thetas)
+        log_priors[~in_bounds] = -np.inf
+        log_likelihood[~in_bounds] = -np.inf
+
+        population = thetas[in_bounds, :]
+        n_pop = np.size(population, axis=0)
+
+        if profiler:
+            profiler.lap('bounds')
+
+        if n_pop == 0:
+            if return_priors is False:
+                return log_likelihood
+            else:
+                return log_priors, log_likelihood
+
+        if getattr(self, 'model_setup_required', False):
+            self.model_setup()
+
+        if getattr(self, 'execution_plan', None) is None:
+            self.prepare_execution_plan()
+
+        parameters = self.compute_parameter_map(population)
+
+        if profiler:
+            profiler.lap('convert')
+
+        pop_priors = np.zeros(n_pop, dtype=np.double)
+        pop_likelihood = np.zeros(n_pop, dtype=np.double)
+
+        pop_priors += giveback_priors_compute(self.priors_constant, self.priors_groups, parameters)
+
+        if profiler:
+            profiler.lap('priors')
+
+        delayed_lnlk_computation = []
+
+        if getattr(self, 'linear_marginalization_parameters', None):
+            n_linear = len(self.linear_marginalization_parameters)
+            normal_matrix = np.zeros([n_pop, n_linear, n_linear], dtype=np.double)
+            normal_vector = np.zeros([n_pop, n_linear], dtype=np.double)
+
+        for dataset_name, dataset, dataset_variables, model_steps, gp_step, \
+                use_external_model, compute_likelihood, linear_steps in self.execution_plan:
+
+            dataset.model_reset(n_population=n_pop)
+            dataset.compute(get_population_columns(self.plan_convert(parameters, dataset_variables)))
+
+            if profiler:
+                profiler.lap('systematics', dataset_name)
+
+            if not compute_likelihood:
+                continue
+
+            step_outputs = []
+            for model, model_variables, model_target, model_slots in model_steps:
+
+                model_output = self.population_compute(model, self.plan_convert(parameters, model_variables),
+                                                       dataset, n_pop)
+                if linear_steps:
+                    step_outputs.append(np.array(model_output, dtype=np.double))
+
+                if model_target == 'jitter':
+                    dataset.jitter += model_output
+                elif model_target == 'additive':
+                    dataset.additive_model += model_output
+                elif model_target == 'unitary':
+                    dataset.unitary_model += model_output
                     if dataset.normalization_model is None:
-                        dataset.normalization_model = np.ones(dataset.n, dtype=np.double)
-                    dataset.normalization_model *= self.models[model_name].compute(variable_values, dataset)
+                        dataset.initialize_normalization_model()
                 else:
-                    dataset.additive_model += self.models[model_name].compute(variable_values, dataset)
+                    if dataset.normalization_model is None:
+                        dataset.initialize_normalization_model()
+                    dataset.normalization_model *= model_output
+
+                if profiler:
+                    profiler.lap('compute', dataset_name, model.model_name)
 
             dataset.compute_model()
             dataset.compute_residuals()
 
-            """ Gaussian Process check MUST be the last one or the program will fail
-             that's because for the GP to work we need to know the _deterministic_ part of the model 
-             (i.e. the theoretical values you get when you feed your model with the parameter values) """
-            if logchi2_gp_model:
+            if profiler:
+                profiler.lap('residuals', dataset_name)
 
-                variable_values = {}
-                for common_ref in self.models[logchi2_gp_model].common_ref:
-                        variable_values.update(self.common_models[common_ref].convert(theta))
+            if gp_step:
+                logchi2_gp_model, model, model_variables, delayed = gp_step
+                variable_values = self.plan_convert(parameters, model_variables)
 
-                variable_values.update(self.models[logchi2_gp_model].convert(theta, dataset_name))
-
-                """ GP Log-likelihood is not computed now because a single matrix must be created with 
-                the joined dataset"""
-                if hasattr(self.models[logchi2_gp_model], 'delayed_lnlk_computation'):
-
-                    self.models[logchi2_gp_model].add_internal_dataset(variable_values, dataset,
-                                                                   reset_status=delayed_lnlk_computation)
-                    delayed_lnlk_computation.append(logchi2_gp_model)
+                """ GP log-likelihood is computed one walker at a time, after restoring the residuals and the
+                jitter of the dataset for the given walker"""
+                if delayed:
+                    delayed_lnlk_computation.append([logchi2_gp_model, dataset, variable_values,
+                                                     dataset.residuals, dataset.jitter])
                 else:
-                    log_likelihood += self.models[logchi2_gp_model].lnlk_compute(variable_values, dataset)
+                    residuals = dataset.residuals
+                    jitter = dataset.jitter
+                    for i_pop in range(0, n_pop):
+                        dataset.residuals = residuals[i_pop, :]
+                        dataset.jitter = jitter[i_pop, :]
+                        pop_likelihood[i_pop] += model.lnlk_compute(self.population_row(variable_values, i_pop),
+                                                                    dataset)
+                    if profiler:
+                        profiler.lap('gp', dataset_name, logchi2_gp_model)
             else:
-                log_likelihood += dataset.model_logchi2()
+                if linear_steps:
+                    self.linear_marginalization_accumulate(parameters, dataset, model_steps, linear_steps,
+                                                           step_outputs, normal_matrix, normal_vector)
+                    if profiler:
+                        profiler.lap('linear_marginalization', dataset_name)
+
+                pop_likelihood += dataset.model_logchi2()
+
+                if profiler:
+                    profiler.lap('logchi2', dataset_name)
 
         """ In case there is more than one GP model"""
-        for logchi2_gp_model in delayed_lnlk_computation:
-            log_likelihood += self.models[logchi2_gp_model].lnlk_compute()
+        if delayed_lnlk_computation:
+            for i_pop in range(0, n_pop):
+                delayed_models = []
+                for logchi2_gp_model, dataset, variable_values, residuals, jitter in delayed_lnlk_computation:
+                    dataset.residuals = residuals[i_pop, :]
+                    dataset.jitter = jitter[i_pop, :]
+                    self.models[logchi2_gp_model].add_internal_dataset(self.population_row(variable_values, i_pop),
+                                                                       dataset,
+                                                                       reset_status=delayed_models)
+                    delayed_models.append(logchi2_gp_model)
+
+                for logchi2_gp_model in delayed_models:
+                    pop_likelihood[i_pop] += self.models[logchi2_gp_model].lnlk_compute()
+
+            if profiler:
+                profiler.lap('gp')
+
+        if getattr(self, 'linear_marginalization_parameters', None):
+            pop_likelihood += self.linear_marginalization_solve(normal_matrix, normal_vector)[0]
+            if profiler:
+                profiler.lap('linear_marginalization')
+
+        for dataset_name, dataset in self.dataset_dict.items():
+            dataset.model_reset()
+
+        log_priors[in_bounds] = pop_priors
+        log_likelihood[in_bounds] = pop_likelihood
 
         if return_priors is False:
             return log_likelihood
         else:
             return log_priors, log_likelihood
 
+    def model_cache_compute(self, parameters, dataset_name, dataset, model, model_variables, model_slots):
+        """ Output of a model for a dataset, the model is computed again only if the values of its parameters
+        differ from those used for the cached output, e.g., when the sampler moves a subset of parameters
+        not related to the model (the jitter of another dataset, the hyperparameters of a GP)"""
+
+        values = parameters[model_slots]
+        cache_key = (dataset_name, model.model_name)
+        cached = self.model_cache.get(cache_key, None)
+
+        if cached is not None and np.array_equal(cached[0], values):
+            return cached[1]
+
+        model_output = model.compute(self.plan_convert(parameters, model_variables), dataset)
+        self.model_cache[cache_key] = (values, model_output)
+        return model_output
+
+    @staticmethod
+    def population_row(variable_values, i_pop):
+        """ Physical parameters of a single walker, extracted from the values computed on a 2-D theta """
+        return {var: (val[i_pop] if np.ndim(val) > 0 else val) for var, val in variable_values.items()}
+
+    def population_compute(self, model, variable_values, dataset, n_pop):
+        """ Compute a model for all the walkers of a population, as a (n_walkers, n_epochs) matrix.
+        Models that do not support 2-D theta are computed one walker at a time """
+
+        if model.population_compute:
+            return model.compute(variable_values, dataset)
+
+        model_output = np.zeros([n_pop, dataset.n], dtype=np.double)
+        for i_pop in range(0, n_pop):
+            model_output[i_pop, :] = model.compute(self.population_row(variable_values, i_pop), dataset)
+        return model_output
+
     def recenter_bounds(self, pop_mean, recenter=True):
         # This function recenters the bounds limits for circular variables
         # Also, it extends the range of a variable if the output of PyDE is a fixed number
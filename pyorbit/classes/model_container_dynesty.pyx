@@ -10,16 +10,23 @@ class ModelContainerDynesty(ModelContainer):
         # Default values, taken from the PyPolyChord wrapper in PolyChord official distribution, V1.9
         self.include_priors = False
         self.nested_sampling_parameters = {'shutdown_jitter': False,
-                                     'include_priors': False}
+                                     'include_priors': False,
+                                     'mode': 'static',
+                                     'nlive': 500,
+                                     'bound': 'multi',
+                                     'sample': 'auto',
+                                     'dlogz': None,
+                                     'maxiter': None,
+                                     'nprocesses': None,
+                                     'queue_size': None,
+                                     'checkpoint_every': 600}
 
         self.output_directory = None
 
     def dynesty_priors(self, cube):
-        theta = np.zeros(len(cube), dtype=np.double)
-
-        for i in range(0, len(cube)):
-            theta[i] = nested_sampling_prior_compute(cube[i], self.priors[i][0], self.priors[i][2], self.spaces[i])
-        return theta
+        """ dynesty requires a new array, the cube must not be modified """
+        nested_sampling_groups = getattr(self, 'nested_sampling_groups', None) or self.prepare_nested_sampling_priors()
+        return nested_sampling_prior_transform_compute(cube, nested_sampling_groups, np.empty(len(cube)))
 
     def dynesty_call(self, theta):
 
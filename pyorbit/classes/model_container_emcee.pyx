@@ -17,11 +17,20 @@ class ModelContainerEmcee(ModelContainer):
                             'nburn':0,
                             'multirun': None,
                             'multirun_iter': 20,
-                            'shutdown_jitter': False
+                            'shutdown_jitter': False,
+                            'vectorize': False,
+                            'nprocesses': None,
+                            'chunksize': None,
+                            'use_hdf5': False
                             }
 
         self.pyde_parameters = {'ngen': 8000,
                            'npop_mult': 4,
-                           'shutdown_jitter': False
+                           'shutdown_jitter': False,
+                           'vectorize': False,
+                           'seed': None,
+                           'nsave': 0,
+                           'stop_window': 0,
+                           'stop_tolerance': 0.01
                            }
 
@@ -44,16 +44,16 @@ class ModelContainerMultiNest(ModelContainer):
 
     def multinest_priors(self, cube, ndim, nparams):
 
-        for i in range(0, ndim):
-            cube[i] = nested_sampling_prior_compute(cube[i], self.priors[i][0], self.priors[i][2], self.spaces[i])
+        """ The ctypes array of MultiNest is transformed in place through a NumPy view """
+        cube_view = np.ctypeslib.as_array(cube, shape=(ndim,))
+        nested_sampling_groups = getattr(self, 'nested_sampling_groups', None) or self.prepare_nested_sampling_priors()
+        nested_sampling_prior_transform_compute(cube_view, nested_sampling_groups, cube_view)
 
     def multinest_call(self, theta1, ndim, nparams):
         # Workaround for variable selection: if a variable as null index
         # (i.e. it has not been included in the model)
         # the numpy array will give back an empty list, the ctype will give back an error
-        theta = np.empty(ndim)
-        for i in range(0, ndim):
-            theta[i] = theta1[i]
+        theta = np.array(np.ctypeslib.as_array(theta1, shape=(ndim,)), dtype=np.double)
 
         chi_out = self(theta, self.include_priors)
 
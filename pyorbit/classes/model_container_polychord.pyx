@@ -15,16 +15,13 @@ class ModelContainerPolyChord(ModelContainer):
         self.output_directory = None
 
     def polychord_priors(self, cube):
-        theta = []
-
-        for i in range(0, len(cube)):
-            theta.append(nested_sampling_prior_compute(cube[i], self.priors[i][0], self.priors[i][2], self.spaces[i]))
-
-        return theta
+        cube = np.asarray(cube, dtype=np.double)
+        nested_sampling_groups = getattr(self, 'nested_sampling_groups', None) or self.prepare_nested_sampling_priors()
+        return nested_sampling_prior_transform_compute(cube, nested_sampling_groups, np.empty(len(cube)))
 
     def polychord_call(self, theta1):
 
-        theta = [theta1[i] for i in range(0, self.ndim)]
+        theta = np.asarray(theta1, dtype=np.double)[:self.ndim]
         phi = [0.0] * 0
         chi_out = self(theta, self.include_priors)
         if chi_out < -0.5e8:
@@ -0,0 +1 @@
+posterior_store.pyx
\ No newline at end of file
@@ -0,0 +1,236 @@
+from __future__ import print_function
+import numpy as np
+import json
+import os
+
+__all__ = ["PosteriorStore", "posterior_store_save", "posterior_store_exists"]
+
+"""
+Posterior store shared by all the samplers
+
+The output of every sampler is saved in the posterior/ subdirectory of its output directory as:
+    * samples.npy: array with shape (n_steps, n_chains, n_dim), i.e. the emcee chain with the walkers
+      along the second axis. The nested samplers are saved as a single chain
+    * lnprob.npy: log-probabilities with shape (n_steps, n_chains)
+    * weights.npy: importance weights with shape (n_steps, n_chains), only for samplers that do not
+      provide equally-weighted samples
+    * metadata.json: sampler name, parameter names (ordered as in theta), burn-in and thinning factor
+      applied during the sampling
+
+The steps are stored along the first axis, so that the removal of the burn-in is a contiguous slice of the
+memory-mapped arrays and statistics can be computed in chunks without loading the full chain in memory
+"""
+
+posterior_store_directory = 'posterior/'
+
+""" Approximate number of values read from disk for each chunk """
+posterior_store_chunk_values = 2 ** 22
+
+
+def posterior_store_exists(output_directory):
+    return os.path.exists(output_directory + posterior_store_directory + 'metadata.json')
+
+
+def posterior_store_save(output_directory, sampler, theta_dict, samples, lnprob, weights=None,
+                         nburn=0, thin=1):
+    """ Save the posterior in the common format
+
+    samples and lnprob follow the emcee convention, i.e. (n_chains, n_steps, n_dim) and (n_chains, n_steps), or
+    they can be a flat list of samples with shape (n_samples, n_dim) and (n_samples). Any array-like object
+    supporting slicing can be provided (e.g. an h5py dataset), the arrays are copied in chunks
+
+    :param output_directory: output directory of the sampler
+    :param sampler: name of the sampler
+    :param theta_dict: dictionary with the position of each parameter in theta
+    :param nburn: burn-in in number of steps, before thinning
+    :param thin: thinning factor already applied to the samples
+    """
+
+    store_directory = output_directory + posterior_store_directory
+    if not os.path.exists(store_directory):
+        os.makedirs(store_directory)
+
+    """ The metadata file is written last, its presence marks a complete store """
+    if os.path.exists(store_directory + 'metadata.json'):
+        os.remove(store_directory + 'metadata.json')
+    if os.path.exists(store_directory + 'weights.npy'):
+        os.remove(store_directory + 'weights.npy')
+
+    if len(np.shape(samples)) == 2:
+        samples = np.asarray(samples)[None, :, :]
+        lnprob = np.asarray(lnprob)[None, :]
+        if weights is not None:
+            weights = np.asarray(weights)[None, :]
+
+    n_chains, n_steps, n_dim = np.shape(samples)
+
+    samples_output = np.lib.format.open_memmap(store_directory + 'samples.npy', mode='w+',
+                                               dtype=np.double, shape=(n_steps, n_chains, n_dim))
+    lnprob_output = np.lib.format.open_memmap(store_directory + 'lnprob.npy', mode='w+',
+                                              dtype=np.double, shape=(n_steps, n_chains))
+    if weights is not None:
+        weights_output = np.lib.format.open_memmap(store_directory + 'weights.npy', mode='w+',
+                                                   dtype=np.double, shape=(n_steps, n_chains))
+
+    chunk_steps = max(posterior_store_chunk_values // (n_chains * n_dim), 1)
+    for i_start in range(0, n_steps, chunk_steps):
+        i_stop = min(i_start + chunk_steps, n_steps)
+        samples_output[i_start:i_stop, :, :] = np.swapaxes(samples[:, i_start:i_stop, :], 0, 1)
+        lnprob_output[i_start:i_stop, :] = np.swapaxes(lnprob[:, i_start:i_stop], 0, 1)
+        if weights is not None:
+            weights_output[i_start:i_stop, :] = np.swapaxes(weights[:, i_start:i_stop], 0, 1)
+
+    samples_output.flush()
+    lnprob_output.flush()
+    del samples_output, lnprob_output
+    if weights is not None:
+        weights_output.flush()
+        del weights_output
+
+    metadata = {
+        'sampler': sampler,
+        'theta_names': [var for var, _ in sorted(theta_dict.items(), key=lambda item: item[1])],
+        'theta_dict': {var: int(i) for var, i in theta_dict.items()},
+        'nburn': int(nburn),
+        'thin': int(thin),
+        'n_steps': int(n_steps),
+        'n_chains': int(n_chains),
+        'n_dim': int(n_dim),
+        'weighted': weights is not None
+    }
+
+    with open(store_directory + 'metadata.json', 'w') as metadata_output:
+        json.dump(metadata, metadata_output, indent=2)
+
+
+class PosteriorStore(object):
+    """ Read-only access to the posterior store, the arrays are memory-mapped
+
+    The burn-in nburn is always expressed in number of steps before thinning, as in the emcee_parameters
+    """
+
+    def __init__(self, output_directory):
+
+        self.store_directory = output_directory + posterior_store_directory
+
+        with open(self.store_directory + 'metadata.json', 'r') as metadata_input:
+            self.metadata = json.load(metadata_input)
+
+        self.sampler = self.metadata['sampler']
+        self.theta_names = self.metadata['theta_names']
+        self.theta_dict = self.metadata['theta_dict']
+        self.thin = self.metadata['thin']
+        self.n_steps = self.metadata['n_steps']
+        self.n_chains = self.metadata['n_chains']
+        self.ndim = self.metadata['n_dim']
+
+        self.samples = np.load(self.store_directory + 'samples.npy', mmap_mode='r')
+        self.lnprob = np.load(self.store_directory + 'lnprob.npy', mmap_mode='r')
+        if self.metadata['weighted']:
+            self.weights = np.load(self.store_directory + 'weights.npy', mmap_mode='r')
+        else:
+            self.weights = None
+
+        self.chunk_steps = max(posterior_store_chunk_values // (self.n_chains * self.ndim), 1)
+
+    def burnin_steps(self, nburn=None):
+        """ Number of stored steps removed as burn-in, same rule as emcee_flatchain """
+        if nburn is None:
+            nburn = self.metadata['nburn']
+        nburn_steps = int(nburn / self.thin)
+        if nburn_steps >= self.n_steps * 0.9:
+            nburn_steps = int(self.n_steps / 4)
+        return nburn_steps
+
+    def _kept_steps(self, nburn=None, thin=1):
+        return slice(self.burnin_steps(nburn), self.n_steps, thin)
+
+    def n_samples(self, nburn=None, thin=1):
+        return len(range(*self._kept_steps(nburn, thin).indices(self.n_steps))) * self.n_chains
+
+    def _chunks(self, nburn=None, thin=1):
+        """ Steps retained after burn-in and thinning, divided in chunks of contiguous steps """
+        kept_steps = self._kept_steps(nburn, thin)
+        chunk_size = self.chunk_steps * thin
+        for i_start in range(kept_steps.start, self.n_steps, chunk_size):
+            yield slice(i_start, min(i_start + chunk_size, self.n_steps), thin)
+
+    def chains(self):
+        """ Memory-mapped view of the chains with the emcee shape (n_chains, n_steps, n_dim) """
+        return np.swapaxes(self.samples, 0, 1)
+
+    def lnprob_chains(self):
+        """ Memory-mapped view of the log-probabilities with shape (n_chains, n_steps) """
+        return np.swapaxes(self.lnprob, 0, 1)
+
+    def flat_samples(self, nburn=None, thin=1):
+        """ Samples after burn-in removal, with shape (n_samples, n_dim)
+
+        Without additional thinning the output is a memory-mapped view of the store, weighted samples are
+        resampled to equal weights with a systematic resampling, only the selected samples are loaded """
+        if self.weights is not None:
+            return self._equal_weights_take(self.samples.reshape(-1, self.ndim), nburn, thin)
+        return self.samples[self._kept_steps(nburn, thin), :, :].reshape(-1, self.ndim)
+
+    def flat_lnprob(self, nburn=None, thin=1):
+        """ Log-probabilities of the samples returned by flat_samples """
+        if self.weights is not None:
+            return self._equal_weights_take(self.lnprob.reshape(-1), nburn, thin)
+        return self.lnprob[self._kept_steps(nburn, thin), :].reshape(-1)
+
+    def _equal_weights_take(self, flat_array, nburn, thin):
+        weights = self.flat_weights(nburn, thin)
+        n_weights = np.size(weights)
+        positions = (np.arange(0, n_weights) + 0.5) / n_weights
+        cumulative_weights = np.cumsum(weights)
+        cumulative_weights /= cumulative_weights[-1]
+        selected = np.minimum(np.searchsorted(cumulative_weights, positions), n_weights - 1)
+
+        kept_index = np.arange(0, self.n_steps * self.n_chains).reshape(self.n_steps, self.n_chains)
+        kept_index = kept_index[self._kept_steps(nburn, thin), :].reshape(-1)
+        return flat_array[kept_index[selected], ...]
+
+    def flat_weights(self, nburn=None, thin=1):
+        if self.weights is None:
+            return np.ones(self.n_samples(nburn, thin))
+        return np.asarray(self.weights[self._kept_steps(nburn, thin), :]).reshape(-1)
+
+    def parameter(self, theta_index, nburn=None, thin=1):
+        """ Samples of a single parameter, read chunk by chunk """
+        return np.concatenate([np.asarray(self.samples[chunk, :, theta_index]).reshape(-1)
+                               for chunk in self._chunks(nburn, thin)])
+
+    def _percentiles(self, values, weights):
+        """ 15.865th, 50th and 84.135th percentiles, weighted samples are interpolated on the cumulative weights """
+        if weights is None:
+            return np.percentile(values, [15.865, 50, 84.135])
+        sort_index = np.argsort(values)
+        cumulative_weights = np.cumsum(weights[sort_index])
+        cumulative_weights = (cumulative_weights - 0.5 * weights[sort_index]) / cumulative_weights[-1]
+        return np.interp([0.15865, 0.50, 0.84135], cumulative_weights, values[sort_index])
+
+    def compute_value_sigma(self, nburn=None, thin=1):
+        """ Median and confidence intervals of each parameter, same output of common.compute_value_sigma for
+        two-dimensional samples. The parameters are processed one at a time """
+        weights = None if self.weights is None else self.flat_weights(nburn, thin)
+        sample_med = np.zeros([self.ndim, 3])
+        for theta_index in range(0, self.ndim):
+            sample_tmp = self._percentiles(self.parameter(theta_index, nburn, thin), weights)
+            sample_med[theta_index, :] = \
+                [sample_tmp[1], sample_tmp[2] - sample_tmp[1], sample_tmp[1] - sample_tmp[0]]
+        return sample_med
+
+    def lnprob_value_sigma(self, nburn=None, thin=1):
+        """ Same output of common.compute_value_sigma for one-dimensional samples """
+        weights = None if self.weights is None else self.flat_weights(nburn, thin)
+        sample_tmp = self._percentiles(np.asarray(self.lnprob[self._kept_steps(nburn, thin), :]).reshape(-1),
+                                       weights)
+        return np.asarray([sample_tmp[1], sample_tmp[2] - sample_tmp[1], sample_tmp[0] - sample_tmp[1]])
+
+    def pick_MAP_parameters(self, nburn=None, thin=1):
+        """ Maximum a posteriori sample, only the log-probabilities are scanned """
+        kept_steps = self._kept_steps(nburn, thin)
+        lnprob_kept = self.lnprob[kept_steps, :]
+        step_max, chain_max = np.unravel_index(np.argmax(lnprob_kept), np.shape(lnprob_kept))
+        step_max = kept_steps.start + step_max * kept_steps.step
+        return np.array(self.samples[step_max, chain_max, :]), self.lnprob[step_max, chain_max]
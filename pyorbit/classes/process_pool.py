@@ -0,0 +1 @@
+process_pool.pyx
\ No newline at end of file
@@ -0,0 +1,175 @@
+from __future__ import print_function
+from multiprocessing import Pool, cpu_count
+import numpy as np
+import os
+
+__all__ = ["ModelContainerPool", "ModelContainerMPIPool", "pool_initializer", "pool_log_probability",
+           "pool_dynesty_call", "pool_dynesty_priors", "available_processes"]
+
+
+""" Model container of the current process, set once for each worker by pool_initializer """
+pool_model_container = None
+
+
+def pool_initializer(mc):
+    global pool_model_container
+    pool_model_container = mc
+
+
+def pool_log_probability(theta):
+    """ Log-probability computed with the model container of the current process: only theta and the
+    output value are exchanged between processes """
+    return pool_model_container(theta)
+
+
+def pool_dynesty_call(theta):
+    return pool_model_container.dynesty_call(theta)
+
+
+def pool_dynesty_priors(cube):
+    return pool_model_container.dynesty_priors(cube)
+
+
+def available_processes():
+    """ Number of cores available to the current process, which may be lower than the number of cores of
+    the node (e.g., when running through a job scheduler) """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return cpu_count()
+
+
+class ModelContainerPool(object):
+    """ Pool of processes for the evaluation of the log-probability of a model container
+
+    The model container is sent to each worker only once, through the initializer of the pool (with the
+    fork start method it is directly inherited from the parent process), so that the samplers must use
+    pool_log_probability instead of the model container itself as log-probability function.
+    The number of processes is limited by the number of available cores and by the number of tasks of each
+    call (e.g. the number of walkers). By default each process receives a single chunk of tasks for each call
+    of map.
+    """
+
+    def __init__(self, mc, n_tasks, n_processes=None, chunksize=None):
+
+        if not n_processes:
+            n_processes = available_processes()
+        self.n_processes = int(max(min(n_processes, n_tasks), 1))
+        self.chunksize = chunksize
+
+        """ The model container is also available to pool_log_probability in the main process """
+        pool_initializer(mc)
+        self.pool = Pool(self.n_processes, initializer=pool_initializer, initargs=(mc,))
+
+    @property
+    def size(self):
+        """ Required by dynesty to set the default queue size """
+        return self.n_processes
+
+    def map(self, function, iterable):
+        tasks = list(iterable)
+        if self.chunksize:
+            chunksize = int(self.chunksize)
+        else:
+            chunksize = int(np.ceil(len(tasks) / float(self.n_processes)))
+        return self.pool.map(function, tasks, chunksize=max(chunksize, 1))
+
+    def close(self):
+        self.pool.close()
+
+    def terminate(self):
+        self.pool.terminate()
+
+    def join(self):
+        self.pool.join()
+
+
+""" Tags of the messages exchanged between the master and the workers of the MPI pool """
+mpi_tag_task = 1
+mpi_tag_result = 2
+mpi_tag_update = 3
+mpi_tag_close = 4
+
+
+class ModelContainerMPIPool(object):
+    """ Master/worker pool over MPI, to distribute the evaluations of the log-probability across nodes
+
+    All the processes must create the pool at the beginning of the run: the master (rank 0) performs the
+    analysis, while the workers enter wait() and leave it only when the master closes the pool.
+    The model container is sent to the workers through update(), and it must be sent again every time
+    the master modifies it (e.g., after the recentering of the bounds). Afterwards, only theta vectors
+    and log-probabilities are exchanged, each worker receives a single chunk of tasks for each call of map.
+
+    Run with, e.g.: mpirun -np 4 python PyORBIT_Run.py emcee config_file.yaml -mpi
+    """
+
+    def __init__(self):
+        from mpi4py import MPI
+
+        self.MPI = MPI
+        self.comm = MPI.COMM_WORLD
+        self.rank = self.comm.Get_rank()
+        self.n_processes = self.comm.Get_size() - 1
+
+        if self.n_processes < 1:
+            raise ValueError('The MPI pool requires at least two processes, e.g.: mpirun -np 4')
+
+    @property
+    def size(self):
+        return self.n_processes
+
+    def is_master(self):
+        return self.rank == 0
+
+    def wait(self):
+        """ Loop of the workers: tasks are evaluated as long as they are sent by the master """
+        if self.is_master():
+            return
+
+        status = self.MPI.Status()
+        while True:
+            task = self.comm.recv(source=0, tag=self.MPI.ANY_TAG, status=status)
+
+            if status.Get_tag() == mpi_tag_close:
+                break
+
+            if status.Get_tag() == mpi_tag_update:
+                pool_initializer(task)
+                continue
+
+            function, thetas = task
+            self.comm.send([function(theta) for theta in thetas], dest=0, tag=mpi_tag_result)
+
+    def update(self, mc):
+        pool_initializer(mc)
+        for worker in range(1, self.n_processes + 1):
+            self.comm.send(mc, dest=worker, tag=mpi_tag_update)
+
+    def map(self, function, iterable):
+        tasks = list(iterable)
+
+        requests = []
+        workers = []
+        for worker, chunk in enumerate(np.array_split(np.arange(len(tasks)), self.n_processes), start=1):
+            if len(chunk) == 0:
+                continue
+            requests.append(self.comm.isend((function, [tasks[i] for i in chunk]), dest=worker, tag=mpi_tag_task))
+            workers.append(worker)
+        self.MPI.Request.waitall(requests)
+
+        results = []
+        for worker in workers:
+            results.extend(self.comm.recv(source=worker, tag=mpi_tag_result))
+        return results
+
+    def close(self):
+        if not self.is_master():
+            return
+        for worker in range(1, self.n_processes + 1):
+            self.comm.send(None, dest=worker, tag=mpi_tag_close)
+
+    def terminate(self):
+        pass
+
+    def join(self):
+        pass
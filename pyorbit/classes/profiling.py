@@ -0,0 +1 @@
+profiling.pyx
\ No newline at end of file
@@ -0,0 +1,78 @@
+from __future__ import print_function
+from timeit import default_timer
+import json
+
+__all__ = ["LikelihoodProfiler"]
+
+
+class LikelihoodProfiler(object):
+    """ Call counts and wall-time spent in each stage of the computation of the likelihood
+
+    Each record is identified by the stage (e.g. 'convert', 'priors', 'compute', 'residuals', 'logchi2', 'gp')
+    and by the names of the dataset and of the model involved, if any.
+    The time of a record is the time elapsed since the previous call of start() or lap(), so that the
+    stages of a likelihood call are measured with a single call of the timer each.
+    """
+
+    def __init__(self):
+        self.counts = {}
+        self.elapsed = {}
+        self.reference = default_timer()
+
+    def start(self):
+        self.reference = default_timer()
+
+    def lap(self, stage, dataset_name=None, model_name=None):
+        current = default_timer()
+        key = (stage, dataset_name, model_name)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.elapsed[key] = self.elapsed.get(key, 0.) + current - self.reference
+        self.reference = current
+
+    def reset(self):
+        self.counts = {}
+        self.elapsed = {}
+
+    def records(self):
+        """ List of records sorted by decreasing total time """
+        output = []
+        for key in sorted(self.elapsed, key=self.elapsed.get, reverse=True):
+            stage, dataset_name, model_name = key
+            output.append({'stage': stage,
+                           'dataset': dataset_name,
+                           'model': model_name,
+                           'calls': self.counts[key],
+                           'total_time': self.elapsed[key],
+                           'time_per_call': self.elapsed[key] / self.counts[key]})
+        return output
+
+    def report(self):
+        records = self.records()
+        total_time = sum(record['total_time'] for record in records)
+
+        print()
+        print('====================================================================================================')
+        print('     Time spent in the computation of the likelihood     ')
+        print('====================================================================================================')
+        print()
+        print('{0:20s} {1:20s} {2:25s} {3:>10s} {4:>12s} {5:>14s} {6:>7s}'.format(
+            'stage', 'dataset', 'model', 'calls', 'total [s]', 'per call [us]', '%'))
+        for record in records:
+            print('{0:20s} {1:20s} {2:25s} {3:10d} {4:12.3f} {5:14.2f} {6:7.2f}'.format(
+                record['stage'],
+                '' if record['dataset'] is None else record['dataset'],
+                '' if record['model'] is None else record['model'],
+                record['calls'],
+                record['total_time'],
+                record['time_per_call'] * 1e6,
+                100. * record['total_time'] / total_time if total_time > 0. else 0.))
+        print()
+        print(' Total time: {0:12.3f} s'.format(total_time))
+        print()
+
+    def save(self, filename):
+        """ Machine-readable dump of the records, to compare different configurations """
+        records = self.records()
+        with open(filename, 'w') as file_output:
+            json.dump({'total_time': sum(record['total_time'] for record in records),
+                       'records': records}, file_output, indent=2)
@@ -5,7 +5,8 @@ import pyorbit.classes.kepler_exo as kepler_exo
 
 
 __all__ = ["results_resumen", "results_derived", "get_planet_variables", "get_theta_dictionary", "get_model",
-           "print_theta_bounds", "print_dictionary", "get_stellar_parameters", "print_integrated_ACF"]
+           "print_theta_bounds", "print_dictionary", "get_stellar_parameters", "print_integrated_ACF",
+           "get_linear_marginalization_samples"]
 
 
 def results_resumen(mc, theta,
@@ -44,6 +45,13 @@ def results_resumen(mc, theta,
     if skip_theta:
         return
 
+    if getattr(mc, 'linear_marginalization_parameters', None):
+        print('====================================================================================================')
+        print('     Statistics on the analytically marginalized linear parameters     ')
+        print('====================================================================================================')
+        print()
+        print_dictionary(get_linear_marginalization_samples(mc, theta))
+
     print('====================================================================================================')
     if is_starting_point:
         print('     Starting point projected onto the physical space     ')
@@ -351,12 +359,48 @@ def get_theta_dictionary(mc):
     return theta_dictionary
 
 
+def get_linear_marginalization_samples(mc, theta):
+    """ Recover the analytically marginalized linear parameters: for each sample of the posterior, a value
+    is drawn from the conditional posterior of the linear parameters, while for a single set of parameters
+    the conditional mean is given back
+    """
+    n_linear = len(mc.linear_marginalization_parameters)
+
+    if len(np.shape(theta)) == 2:
+        n_samples, n_values = np.shape(theta)
+        linear_samples = np.zeros([n_samples, n_linear], dtype=np.double)
+        for i in range(0, n_samples):
+            mean, covariance = mc.linear_marginalization_posterior(theta[i, :])
+            if mean is None:
+                linear_samples[i, :] = np.nan
+            else:
+                linear_samples[i, :] = np.random.multivariate_normal(mean, covariance)
+    else:
+        linear_samples, covariance = mc.linear_marginalization_posterior(theta)
+        if linear_samples is None:
+            return {}
+
+    output_dictionary = {}
+    for i_lin, linear_parameter in enumerate(mc.linear_marginalization_parameters):
+        output_dictionary[linear_parameter[0]] = np.asarray(linear_samples)[..., i_lin]
+    return output_dictionary
+
+
 def get_model(mc, theta, bjd_dict):
     model_out = {}
     model_x0 = {}
 
     delayed_lnlk_computation = {}
 
+    """ The marginalized linear parameters are set to their conditional mean """
+    if getattr(mc, 'linear_marginalization_parameters', None):
+        linear_mean, linear_covariance = mc.linear_marginalization_posterior(theta)
+        mc.linear_marginalization_set_values(linear_mean)
+
+    profiler = getattr(mc, 'profiler', None)
+    if profiler:
+        profiler.start()
+
     if mc.dynamical_model is not None:
         """ check if any keyword ahas get the output model from the dynamical tool
         we must do it here because all the planet are involved"""
@@ -438,6 +482,9 @@ def get_model(mc, theta, bjd_dict):
             else:
                 model_x0[dataset_name][model_name] = mc.models[model_name].compute(variable_values, dataset, x0_plot)
 
+            if profiler:
+                profiler.lap('get_model', dataset_name, model_name)
+
             if getattr(mc.models[model_name], 'systematic_model', False):
                 continue
 
@@ -501,6 +548,9 @@ def get_model(mc, theta, bjd_dict):
                 model_x0[dataset_name][logchi2_gp_model + '_std'] = np.sqrt(var)
                 model_x0[dataset_name]['complete'] += model_x0[dataset_name][logchi2_gp_model]
 
+                if profiler:
+                    profiler.lap('get_model_gp', dataset_name, logchi2_gp_model)
+
     for dataset_name, logchi2_gp_model in delayed_lnlk_computation.items():
         model_out[dataset_name][logchi2_gp_model] = \
             mc.models[logchi2_gp_model].sample_conditional(mc.dataset_dict[dataset_name])
@@ -513,6 +563,12 @@ def get_model(mc, theta, bjd_dict):
         model_x0[dataset_name][logchi2_gp_model + '_std'] = np.sqrt(var)
         model_x0[dataset_name]['complete'] += model_x0[dataset_name][logchi2_gp_model]
 
+        if profiler:
+            profiler.lap('get_model_gp', dataset_name, logchi2_gp_model)
+
+    if getattr(mc, 'linear_marginalization_parameters', None):
+        mc.linear_marginalization_set_values()
+
     # workaround to avoid memory leaks from GP module
     # gc.collect()
 
@@ -11,6 +11,23 @@ class AbstractModel(object):
     unitary_model = False
     normalization_model = False
 
+    """ True if compute() accepts the physical parameters of a whole population of walkers (i.e., obtained from a
+    2-D theta) and gives back a (n_walkers, n_epochs) model """
+    population_compute = False
+
+    """ Parameters entering the model linearly, i.e., the output of compute() is a linear combination of these
+    parameters. They can be marginalized analytically by the ModelContainer when the model is additive """
+    linear_parameters = {}
+
+    """ False if compute() modifies a state shared among datasets, in which case the datasets using the model
+    are never evaluated concurrently by the ModelContainer (see dataset_threads) """
+    thread_safe = True
+
+    """ Objects built by initialize_model and setup_dataset from the configuration and the data, e.g. the objects
+    of external packages or precomputed distance matrices. They are not pickled, ModelContainer.model_setup
+    rebuilds them after loading """
+    runtime_attributes = []
+
     def __init__(self, model_name, common_ref):
         self.model_name = model_name
 
@@ -47,6 +64,13 @@ class AbstractModel(object):
 
         self.model_conf = None
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in self.runtime_attributes:
+            if name in state:
+                state[name] = {} if isinstance(state[name], dict) else None
+        return state
+
     def initialize_model(self, mc, **kwargs):
         pass
 
@@ -110,15 +134,9 @@ class AbstractModel(object):
                     self.prior_kind[dataset_name][var] = self.default_priors[var][0]
                     self.prior_pams[dataset_name][var] = self.default_priors[var][1]
 
-                nested_coeff =  nested_sampling_prior_prepare(self.prior_kind[dataset_name][var],
-                                                              output_lists['bounds'][-1],
-                                                              self.prior_pams[dataset_name][var],
-                                                              self.spaces[dataset_name][var])
-
                 output_lists['spaces'].append(self.spaces[dataset_name][var])
                 output_lists['priors'].append([self.prior_kind[dataset_name][var],
-                                               self.prior_pams[dataset_name][var],
-                                               nested_coeff])
+                                               self.prior_pams[dataset_name][var]])
 
                 self.variable_index[dataset_name][var] = ndim
                 self.variable_sampler[dataset_name][var] = ndim
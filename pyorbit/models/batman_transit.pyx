@@ -8,6 +8,11 @@ class Batman_Transit(AbstractModel):
     model_class = 'transit'
     unitary_model = True
 
+    runtime_attributes = ['batman_params', 'batman_models']
+
+    """ self.batman_params is updated at each call of compute() """
+    thread_safe = False
+
     default_bounds = {}
     default_spaces = {}
     default_priors = {}
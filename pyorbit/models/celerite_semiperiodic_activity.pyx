@@ -9,6 +9,8 @@ class Celerite_QuasiPeriodicActivity(AbstractModel):
 
     model_class = 'celerite_quasiperiodic'
 
+    runtime_attributes = ['gp']
+
     list_pams_common = {
         'Prot', # Rotational period of the star
         'Pdec',
@@ -25,6 +25,7 @@ class Jitter(AbstractModel):
 
     model_class = 'common_jitter'
     jitter_model = True
+    population_compute = True
 
     list_pams_common = {'jitter'}
     list_pams_dataset = {}
@@ -58,7 +59,7 @@ class Jitter(AbstractModel):
         return
 
     def compute(self, variable_value, dataset, x0_input=None):
-        return variable_value['jitter']
+        return get_population_columns(variable_value)['jitter']
 
 
 
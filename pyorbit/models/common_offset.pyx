@@ -21,9 +21,11 @@ class Offset(AbstractModel):
 
     model_class = 'common_offset'
     systematic_model = True
+    population_compute = True
 
     list_pams_common = {'offset': 'U'}
     list_pams_dataset = {}
+    linear_parameters = {'offset'}
 
     recenter_pams_dataset = {}
 
@@ -54,7 +56,7 @@ class Offset(AbstractModel):
         return
 
     def compute(self, variable_value, dataset, x0_input=None):
-        return variable_value['offset']
+        return get_population_columns(variable_value)['offset']
 
 
 
@@ -63,9 +63,11 @@ class LocalCorrelation(AbstractModel):
         except (KeyError, ValueError):
             self.fix_list[dataset_ref.name_ref]['x_zero'] = np.asarray([np.median(self.x_vals[self.x_mask]), 0.0000], dtype=np.double)
 
+        self.linear_parameters = {}
         for i_order in range(1, self.order+1):
             var = 'c'+repr(i_order)
             self.list_pams_dataset.update({var: None})
+            self.linear_parameters.update({var: None})
             self.default_bounds.update({var: [-10**9, 10**9]})
             self.default_spaces.update({var: 'Linear'})
             self.default_priors.update({var: ['Uniform', []]})
@@ -1,5 +1,6 @@
 from pyorbit.classes.common import *
 from pyorbit.models.abstract_common import *
+from pyorbit.classes.dataset_cache import dataset_cache_load, dataset_cache_save
 
 
 kind_definition = {
@@ -69,12 +70,28 @@ class Dataset(AbstractCommon):
         self.normalization_model = None
         self.jitter = None
         self.mask = {}
+        self.systematic_groups = []
+
+        """ Buffers for the models, allocated once and reused at every call of model_reset
+        (see model_buffers_allocate)"""
+        self.model_buffers = {}
+        self.model_workspace = None
+
+    def convert_dataset_from_file(self, input_file, cache_directory=None):
+        """ When cache_directory is provided, the parsed array is stored as a .npy file and it is memory-mapped
+        instead of parsing again the text file, as long as the file is not modified (see dataset_cache) """
+        if cache_directory:
+            data_input, source_stat = dataset_cache_load(input_file, cache_directory)
+            if data_input is not None:
+                return data_input
 
-    def convert_dataset_from_file(self, input_file):
         data = np.atleast_2d(np.loadtxt(input_file))
 
         data_input = np.zeros([np.size(data, axis=0), 6], dtype=np.double) - 1.
         data_input[:, :np.size(data, axis=1)] = data[:, :]
+
+        if cache_directory:
+            dataset_cache_save(input_file, cache_directory, data_input, source_stat)
         return data_input
 
     def define_dataset_base(self, data_input, update=False, flag_shutdown_jitter=False):
@@ -121,7 +138,9 @@ class Dataset(AbstractCommon):
         self.create_systematic_mask('jitter', data_input[:, 3])
         self.create_systematic_mask('offset', data_input[:, 4])
         self.create_systematic_mask('linear', data_input[:, 5])
+        self.create_systematic_groups()
 
+        self.model_buffers = {}
         self.model_reset()
 
     def create_systematic_dictionaries(self, var_generic, dataset_vals):
@@ -153,6 +172,29 @@ class Dataset(AbstractCommon):
             self.variable_expanded.pop(var, None)
             self.mask.pop(var)
         self.variable_compressed[var_generic] = {}
+        self.create_systematic_groups()
+
+    def create_systematic_groups(self):
+        """ Integer labels of the systematic groups (jitter_0, jitter_1, ..., offset_0, ...) of each data point,
+        one array for each kind of systematic. Points not belonging to any group are associated to an
+        additional label, corresponding to a null value.
+        Each element of the list is a tuple with:
+            var_generic, labels, list of (var, label) for the variables in list_pams, n_labels
+        """
+        self.systematic_groups = []
+
+        for var_generic in ['jitter', 'offset', 'linear']:
+            variables = [[var, int(var[len(var_generic)+1:])] for var in self.list_pams
+                         if self.variable_expanded.get(var, None) == var_generic and var in self.mask]
+            if not variables:
+                continue
+
+            n_labels = max([label for var, label in variables]) + 1
+            labels = np.zeros(self.n, dtype=np.int64) + n_labels
+            for var, label in variables:
+                labels[self.mask[var]] = label
+
+            self.systematic_groups.append((var_generic, labels, variables, n_labels))
 
     def shutdown_jitter(self):
         self.delete_systematic_dictionaries_mask('jitter')
@@ -168,30 +210,86 @@ class Dataset(AbstractCommon):
         self.x0 = self.x - self.Tref
         return
 
-    def model_reset(self):
+    def __getstate__(self):
+        """ Model buffers are not saved, they are allocated again by model_reset when the object is unpickled
+        (i.e., independently by each worker of a pool). The models pointing to the buffers are dropped as well """
+        state = self.__dict__.copy()
+        state['model_buffers'] = {}
+        state['model_workspace'] = None
+        for key_name in ['residuals', 'model', 'additive_model', 'unitary_model', 'normalization_model',
+                         'external_model', 'jitter']:
+            state[key_name] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.model_reset()
+
+    def model_buffers_allocate(self, model_shape):
+        buffers = {}
+        for key_name in ['additive', 'unitary', 'external', 'jitter', 'normalization',
+                         'model', 'residuals', 'work', 'logchi2']:
+            buffers[key_name] = np.zeros(model_shape, dtype=np.double)
+        buffers['e2'] = np.square(self.e, dtype=np.double)
+        return buffers
+
+    def model_reset(self, n_population=None):
+        """ Models are stored in buffers that are allocated only once and then zero-filled in place.
+        When n_population is provided, the models are stored as (n_population, n) matrices,
+        one row for each walker of the population """
+
+        # Fixing back-compatibility issues with datasets saved before the introduction of the buffers
+        if not hasattr(self, 'model_buffers'):
+            self.model_buffers = {}
+        if not hasattr(self, 'systematic_groups'):
+            self.create_systematic_groups()
+
+        if n_population is None:
+            if 'single' not in self.model_buffers:
+                self.model_buffers['single'] = self.model_buffers_allocate(self.n)
+            self.model_workspace = self.model_buffers['single']
+        else:
+            if 'population' not in self.model_buffers \
+                    or np.size(self.model_buffers['population']['model'], axis=0) < n_population:
+                self.model_buffers['population'] = self.model_buffers_allocate([n_population, self.n])
+            self.model_workspace = {key_name: (val if key_name == 'e2' else val[:n_population, :])
+                                    for key_name, val in self.model_buffers['population'].items()}
+
+        for key_name in ['additive', 'unitary', 'external', 'jitter']:
+            self.model_workspace[key_name].fill(0.)
+
         self.residuals = None
         self.model = None
-        self.additive_model = np.zeros(self.n, dtype=np.double)
-        self.unitary_model = np.zeros(self.n, dtype=np.double)
+        self.additive_model = self.model_workspace['additive']
+        self.unitary_model = self.model_workspace['unitary']
         self.normalization_model = None
-        self.external_model = np.zeros(self.n, dtype=np.double)
-        self.jitter = np.zeros(self.n, dtype=np.double)
+        self.external_model = self.model_workspace['external']
+        self.jitter = self.model_workspace['jitter']
         return
 
+    def initialize_normalization_model(self):
+        self.normalization_model = self.model_workspace['normalization']
+        self.normalization_model.fill(1.)
+
     def compute(self, variable_value):
-        for var in self.list_pams:
-            if self.variable_expanded[var] == 'jitter':
-                self.jitter[self.mask[var]] += variable_value[var]
+        """ The values of the systematic variables are distributed over the data points with a single
+        gather for each kind of systematic, i.e., values[labels]"""
+        for var_generic, labels, variables, n_labels in self.systematic_groups:
+            values = np.zeros(np.shape(self.jitter)[:-1] + (n_labels + 1,), dtype=np.double)
+            for var, label in variables:
+                values[..., label:label+1] = variable_value[var]
+
+            if var_generic == 'jitter':
+                self.jitter += values[..., labels]
             else:
-                self.additive_model[self.mask[var]] += variable_value[var]
+                self.additive_model += values[..., labels]
 
     def compute_model(self):
-        if self.normalization_model is None:
-            self.model = self.additive_model + self.external_model
-        else:
-            self.model = self.additive_model + \
-                         self.external_model + \
-                         (1. + self.unitary_model)*self.normalization_model
+        self.model = np.add(self.additive_model, self.external_model, out=self.model_workspace['model'])
+        if self.normalization_model is not None:
+            work = np.add(1., self.unitary_model, out=self.model_workspace['work'])
+            work *= self.normalization_model
+            self.model += work
 
     def compute_model_from_arbitrary_datasets(self, additive_model, unitary_model, normalization_model, external_model):
         if normalization_model is None or unitary_model is None:
@@ -200,13 +298,21 @@ class Dataset(AbstractCommon):
             return additive_model + external_model + (1. + unitary_model)*normalization_model
 
     def compute_residuals(self):
-        self.residuals = self.y - self.model
+        self.residuals = np.subtract(self.y, self.model, out=self.model_workspace['residuals'])
 
     def model_logchi2(self):
+        """ Same as -0.5 * (n log(2 pi) + sum(residuals**2 * env - log(env))), with env = 1 / (e**2 + jitter**2),
+        computed in place over the workspace of the dataset """
+
+        env = np.square(self.jitter, out=self.model_workspace['work'])
+        env += self.model_workspace['e2']
+        np.divide(1.0, env, out=env)
+
+        chi2 = np.square(self.residuals, out=self.model_workspace['logchi2'])
+        chi2 *= env
+        chi2 -= np.log(env, out=env)
 
-        env = 1.0 / (self.e ** 2.0 + self.jitter ** 2.0)
-        return -0.5 * (self.n * np.log(2 * np.pi) +
-                       np.sum(self.residuals ** 2 * env - np.log(env)))
+        return -0.5 * (self.n * np.log(2 * np.pi) + np.sum(chi2, axis=-1))
 
     def update_bounds_spaces_priors_starts(self):
 
@@ -16,6 +16,8 @@ class GaussianProcess_QuasiPeriodicActivity(AbstractModel):
 
     model_class = 'gp_quasiperiodic'
 
+    runtime_attributes = ['gp']
+
     list_pams_common = {
         'Prot', # Rotational period of the star
         'Pdec', # Decay timescale of activity
@@ -22,6 +22,8 @@ class GaussianProcess_QuasiPeriodicActivity_Alternative(AbstractModel):
 
     model_class = 'gp_quasiperiodic_alternative'
 
+    runtime_attributes = ['_dist_t1', '_dist_t2']
+
     list_pams_common = {
         'Prot', # Rotational period of the star
         'Pdec', # Decay timescale of activity
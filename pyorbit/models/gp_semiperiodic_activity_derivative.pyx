@@ -18,6 +18,8 @@ class GaussianProcess_QuasiPeriodicActivity_Derivative(AbstractModel):
 
     model_class = 'gp_quasiperiodic_derivative'
 
+    runtime_attributes = ['_dist_t1', '_dist_t2']
+
     list_pams_common = {
         'Prot', # Rotational period of the star
         'Pdec', # Decay timescale of activity
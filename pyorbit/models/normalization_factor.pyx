@@ -40,6 +40,7 @@ class NormalizationFactor(AbstractModel):
     model_class = 'normalization_factor'
     unitary_model = False
     normalization_model = True
+    population_compute = True
 
     list_pams_common = {
         'n_factor',  # Diluition factor, expressed as all_other_stars / star_A ratio of flux
@@ -61,4 +62,4 @@ class NormalizationFactor(AbstractModel):
         :param x0_input:
         :return:
         """
-        return np.asarray(variable_value['n_factor'])
+        return np.asarray(get_population_columns(variable_value)['n_factor'])
@@ -211,13 +211,8 @@ class CommonPlanets(AbstractCommon):
                 self.prior_kind[var] = self.default_priors[var][0]
                 self.prior_pams[var] = self.default_priors[var][1]
 
-            nested_coeff = nested_sampling_prior_prepare(self.prior_kind[var],
-                                                          output_lists['bounds'][-1],
-                                                          self.prior_pams[var],
-                                                          self.spaces[var])
-
             output_lists['spaces'].append(self.spaces[var])
-            output_lists['priors'].append([self.prior_kind[var], self.prior_pams[var], nested_coeff])
+            output_lists['priors'].append([self.prior_kind[var], self.prior_pams[var]])
 
             self.variable_sampler[var] = ndim
             ndim += 1
@@ -115,9 +115,11 @@ class PolynomialTrend(AbstractModel):
         if self.normalization_model:
             self.starting_order = 0
 
+        self.linear_parameters = {}
         for i_order in range(self.starting_order, self.order+1):
             var = 'poly_c'+repr(i_order)
             self.list_pams_common.update({var: None})
+            self.linear_parameters.update({var: None})
 
         for common_ref in self.common_ref:
             if mc.common_models[common_ref].model_class == 'polynomial_trend':
@@ -193,9 +195,11 @@ class LocalPolynomialTrend(AbstractModel):
         if self.normalization_model:
             self.starting_order = 0
 
+        self.linear_parameters = {}
         for i_order in range(self.starting_order, self.order+1):
             var = 'poly_c'+repr(i_order)
             self.list_pams_dataset.update({var: None})
+            self.linear_parameters.update({var: None})
 
     def setup_dataset(self, mc, dataset, **kwargs):
 
@@ -19,6 +19,7 @@ New changes:
 
 class RVkeplerian(AbstractModel):
     model_class = 'rv_keplerian'
+    population_compute = True
 
     def __init__(self, *args, **kwargs):
         super(RVkeplerian, self).__init__(*args, **kwargs)
@@ -52,6 +53,8 @@ class RVkeplerian(AbstractModel):
             self.list_pams_common.update({'K': None})
 
     def compute(self, variable_value, dataset, x0_input=None):
+        """ When the parameters come from a 2-D theta, the output is a (n_walkers, n_epochs) matrix """
+        variable_value = get_population_columns(variable_value)
 
         if self.use_time_of_transit:
             f = kepler_exo.kepler_Tc2phase_Tref(variable_value['P'],
@@ -1,6 +1,7 @@
 from pyorbit.classes.common import *
 from pyorbit.models.abstract_common import *
 from pyorbit.models.abstract_model import *
+import pyorbit.classes.kepler_exo as kepler_exo
 
 """
 New changes:
@@ -17,6 +18,7 @@ New changes:
 class SinusoidCommonPeriod(AbstractModel):
 
     model_class = 'sinusoid_common_period'
+    population_compute = True
 
     list_pams_common = {
         'P' # Period, log-uniform prior
@@ -27,9 +29,14 @@ class SinusoidCommonPeriod(AbstractModel):
         'f'  # RV vurve phase, log-uniform prior
     }
 
+    """ Circular orbit: the output is proportional to the semi-amplitude """
+    linear_parameters = {'K'}
+
     recenter_pams_dataset = {'f'}
 
     def compute(self, variable_value, dataset, x0_input=None):
+        variable_value = get_population_columns(variable_value)
+
         if x0_input is None:
             return kepler_exo.kepler_RV_T0P(dataset.x0,
                                             variable_value['f'],
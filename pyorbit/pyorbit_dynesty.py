@@ -2,7 +2,12 @@ from __future__ import print_function
 from pyorbit.classes.common import *
 from pyorbit.classes.model_container_dynesty import ModelContainerDynesty
 from pyorbit.classes.input_parser import yaml_parser, pars_input
-from pyorbit.classes.io_subroutines import nested_sampling_save_to_cpickle, nested_sampling_load_from_cpickle, nested_sampling_create_dummy_file
+from pyorbit.classes.io_subroutines import nested_sampling_save_to_cpickle, nested_sampling_load_from_cpickle, \
+    nested_sampling_create_dummy_file, dynesty_save_to_cpickle, dynesty_save_checkpoint_model, \
+    dynesty_load_checkpoint_model
+from pyorbit.classes.posterior_store import posterior_store_save
+from pyorbit.classes.process_pool import ModelContainerPool, ModelContainerMPIPool, \
+    pool_dynesty_call, pool_dynesty_priors
 import pyorbit.classes.results_analysis as results_analysis
 import os
 import sys
@@ -10,7 +15,7 @@ import argparse
 
 __all__ = ["pyorbit_dynesty", "yaml_parser"]
 
-""" 
+"""
 def show(filepath):
     # open the output (pdf) file for the user
     if os.name == 'mac': subprocess.call(('open', filepath))
@@ -20,6 +25,14 @@ def show(filepath):
 
 def pyorbit_dynesty(config_in, input_datasets=None, return_output=None):
 
+    """ With the MPI pool, the workers receive the model container from the master and do nothing else """
+    if (config_in['solver'] or {}).get('use_mpi_pool', False):
+        mpi_pool = ModelContainerMPIPool()
+        if not mpi_pool.is_master():
+            mpi_pool.wait()
+            return
+    else:
+        mpi_pool = None
 
     output_directory = './' + config_in['output'] + '/dynesty/'
 
@@ -27,12 +40,13 @@ def pyorbit_dynesty(config_in, input_datasets=None, return_output=None):
     pars_input(config_in, mc, input_datasets)
 
     if mc.nested_sampling_parameters['shutdown_jitter']:
-        for dataset in mc.dataset_dict.itervalues():
+        for dataset_name, dataset in mc.dataset_dict.items():
             dataset.shutdown_jitter()
 
     mc.model_setup()
     mc.create_variables_bounds()
     mc.initialize_logchi2()
+    mc.prepare_nested_sampling_priors()
 
     mc.create_starting_point()
 
@@ -40,53 +54,128 @@ def pyorbit_dynesty(config_in, input_datasets=None, return_output=None):
 
     mc.output_directory = output_directory
 
+    if not os.path.exists(output_directory):
+        os.makedirs(output_directory)
+
+    if 'include_priors' in mc.nested_sampling_parameters:
+        mc.include_priors = mc.nested_sampling_parameters['include_priors']
+
+    if 'nlive_mult' in mc.nested_sampling_parameters:
+        nlive = mc.ndim * mc.nested_sampling_parameters['nlive_mult']
+    else:
+        nlive = mc.nested_sampling_parameters['nlive']
+
+    mode = mc.nested_sampling_parameters['mode']
+    if mode not in ['static', 'dynamic']:
+        print('ERROR: dynesty mode must be either static or dynamic')
+        quit()
+
     print()
     print('Reference Time Tref: ', mc.Tref)
+    print()
+    print('Dynesty mode: ', mode)
+    print('N live points:', nlive)
+    print('Including priors to log-likelihood calculation (must be False):', mc.include_priors)
+
+    """ The state of the sampler is saved every checkpoint_every seconds, a previous run is resumed from
+    its last checkpoint (dynesty 2.0 or later).
+    The order of the parameters in theta depends on string hashing and it may change in a new process: the live
+    points of the checkpoint are consistent only with the model container of the process that wrote it, which is
+    saved together with the checkpoint and then used for the rest of the run (pool included) """
+    checkpoint_file = output_directory + 'dynesty_checkpoint.save'
+    resume_checkpoint = mc.nested_sampling_parameters['checkpoint_every'] and os.path.exists(checkpoint_file)
+    theta_dict = results_analysis.get_theta_dictionary(mc)
+
+    if resume_checkpoint:
+        try:
+            mc_checkpoint, theta_dict_checkpoint = dynesty_load_checkpoint_model(output_directory)
+        except (IOError, OSError):
+            mc_checkpoint, theta_dict_checkpoint = None, {}
+
+        if set(theta_dict_checkpoint) != set(theta_dict):
+            print('ERROR: the parameters of the dynesty checkpoint are missing or do not match the current '
+                  'configuration, remove ', checkpoint_file, ' to start a new run')
+            if mpi_pool:
+                mpi_pool.close()
+            quit()
+
+        if theta_dict_checkpoint != theta_dict:
+            print('Order of the parameters taken from the dynesty checkpoint')
+        mc, theta_dict = mc_checkpoint, theta_dict_checkpoint
+
+    elif mc.nested_sampling_parameters['checkpoint_every']:
+        dynesty_save_checkpoint_model(mc, theta_dict)
+
+    """ The log-likelihood and the prior transform are evaluated by the workers with their own copy of the
+    model container, only the parameters and the outputs are exchanged """
+    pool = None
+    if mpi_pool:
+        mpi_pool.update(mc)
+        pool = mpi_pool
+    elif getattr(mc, 'use_threading_pool', False):
+        pool = ModelContainerPool(mc, nlive, n_processes=mc.nested_sampling_parameters['nprocesses'])
+
+    if pool:
+        dynesty_call, dynesty_priors = pool_dynesty_call, pool_dynesty_priors
+        queue_size = mc.nested_sampling_parameters['queue_size'] or pool.size
+        print('Number of processes in the pool: ', pool.size)
+        print('Queue size: ', queue_size)
+    else:
+        dynesty_call, dynesty_priors = mc.dynesty_call, mc.dynesty_priors
+        queue_size = None
+
     print()
     print('*************************************************************')
     print()
 
     import dynesty
 
-    # "Standard" nested sampling.
-    sampler = dynesty.NestedSampler(mc.dynesty_call, mc.dynesty_priors, mc.ndim)
-    sampler.run_nested()
-    results = sampler.results
-
-    # "Dynamic" nested sampling.
-    dsampler = dynesty.DynamicNestedSampler(mc.dynesty_call, mc.dynesty_priors, mc.ndim)
-    dsampler.run_nested()
-    dresults = dsampler.results
-
-    from dynesty import plotting as dyplot
-
-    # Plot a summary of the run.
-    rfig, raxes = dyplot.runplot(results)
+    if mode == 'static':
+        sampler_class = dynesty.NestedSampler
+        sampler_kwargs = dict(nlive=nlive)
+        run_kwargs = dict(dlogz=mc.nested_sampling_parameters['dlogz'])
+    else:
+        sampler_class = dynesty.DynamicNestedSampler
+        sampler_kwargs = dict()
+        run_kwargs = dict(nlive_init=nlive, dlogz_init=mc.nested_sampling_parameters['dlogz'] or 0.01)
 
-    # Plot traces and 1-D marginalized posteriors.
-    tfig, taxes = dyplot.traceplot(results)
+    run_kwargs['maxiter'] = mc.nested_sampling_parameters['maxiter']
 
-    # Plot the 2-D marginalized posteriors.
-    cfig, caxes = dyplot.cornerplot(results)
+    if mc.nested_sampling_parameters['checkpoint_every']:
+        run_kwargs['checkpoint_file'] = checkpoint_file
+        run_kwargs['checkpoint_every'] = mc.nested_sampling_parameters['checkpoint_every']
 
-    from dynesty import utils as dyfunc
+    if resume_checkpoint:
+        print('Resuming dynesty from ', checkpoint_file)
+        sampler = sampler_class.restore(checkpoint_file, pool=pool)
+        run_kwargs['resume'] = True
+    else:
+        sampler = sampler_class(dynesty_call, dynesty_priors, mc.ndim,
+                                bound=mc.nested_sampling_parameters['bound'],
+                                sample=mc.nested_sampling_parameters['sample'],
+                                pool=pool, queue_size=queue_size, **sampler_kwargs)
 
-    # Extract sampling results.
-    samples = results.samples  # samples
-    weights = np.exp(results.logwt - results.logz[-1])  # normalized weights
+    sys.stdout.flush()
+    sampler.run_nested(**run_kwargs)
+    results = sampler.results
 
-    # Compute 5%-95% quantiles.
-    quantiles = dyfunc.quantile(samples, [0.05, 0.95], weights=weights)
+    if pool:
+        pool.close()
+        pool.terminate()
+        pool.join()
 
-    # Compute weighted mean and covariance.
-    mean, cov = dyfunc.mean_and_cov(samples, weights)
+    nested_sampling_save_to_cpickle(mc)
+    dynesty_save_to_cpickle(mc, results)
 
-    # Resample weighted samples.
-    samples_equal = dyfunc.resample_equal(samples, weights)
+    """ The weighted samples are stored, the resampling to equal weights is performed when reading them """
+    posterior_store_save(output_directory, 'dynesty', theta_dict,
+                         results.samples, results.logl, weights=np.exp(results.logwt - results.logz[-1]))
 
-    # Generate a new set of results with statistical+sampling uncertainties.
-    results_sim = dyfunc.simulate_run(results)
+    print()
+    print('dynesty COMPLETED')
+    print()
 
+    print('evidence: {0:.1f} +- {1:.1f}'.format(results.logz[-1], results.logzerr[-1]))
 
     """ A dummy file is created to let the cpulimit script to proceed with the next step"""
     nested_sampling_create_dummy_file(mc)
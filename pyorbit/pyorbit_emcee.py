@@ -3,19 +3,47 @@ from pyorbit.classes.common import *
 from pyorbit.classes.model_container_emcee import ModelContainerEmcee
 from pyorbit.classes.input_parser import yaml_parser, pars_input
 from pyorbit.classes.io_subroutines import pyde_save_to_pickle, pyde_load_from_cpickle, \
-    emcee_save_to_cpickle, emcee_load_from_cpickle, emcee_flatchain, emcee_create_dummy_file, \
-    starting_point_load_from_cpickle, starting_point_save_to_cpickle
+    pyde_save_checkpoint, pyde_load_checkpoint, \
+    emcee_save_to_cpickle, emcee_load_from_cpickle, emcee_flatchain, emcee_create_dummy_file, emcee_save_to_hdf5, \
+    emcee_hdf5_nsteps, starting_point_load_from_cpickle, starting_point_save_to_cpickle
+from pyorbit.classes.posterior_store import posterior_store_save, posterior_store_exists
+from pyorbit.classes.process_pool import ModelContainerPool, ModelContainerMPIPool, pool_log_probability
 import pyorbit.classes.results_analysis as results_analysis
 import emcee
 import os
 import sys
+from timeit import default_timer
 
 
 __all__ = ["pyorbit_emcee", "yaml_parser"]
 
 
+def numba_random_seed(seed):
+    np.random.seed(seed)
+
+
+def pyde_random_seed(seed):
+    """ PyDE draws its random numbers from NumPy and, inside the functions compiled with numba, from the numba
+    random generator, which must be seeded separately """
+    np.random.seed(seed)
+    try:
+        from numba import njit
+        njit(numba_random_seed)(seed)
+    except Exception:
+        pass
+
+
 def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
 
+    """ With the MPI pool, the workers receive the model container from the master and do nothing else """
+    if (config_in['solver'] or {}).get('use_mpi_pool', False):
+        mpi_pool = ModelContainerMPIPool()
+        if not mpi_pool.is_master():
+            mpi_pool.wait()
+            return
+    else:
+        mpi_pool = None
+
     optimize_dir_output = './' + config_in['output'] + '/optimize/'
     pyde_dir_output = './' + config_in['output'] + '/pyde/'
     emcee_dir_output = './' + config_in['output'] + '/emcee/'
@@ -40,8 +68,8 @@ def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
         pass
 
     try:
-        mc, starting_point, population, _, _, sampler_chain, sampler_lnprobability, _, theta_dict = \
-            emcee_load_from_cpickle(emcee_dir_output)
+        mc, starting_point, population, prob, state, sampler_chain, sampler_lnprobability, \
+            sampler_acceptance_fraction, theta_dict = emcee_load_from_cpickle(emcee_dir_output)
         reloaded_emcee = True
     except:
         pass
@@ -58,6 +86,17 @@ def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
     print('reloaded_emcee_multirun: ', reloaded_emcee_multirun)
     print('reloaded_emcee: ', reloaded_emcee)
 
+    """ A chain saved with the HDF5 backend is complete only if all the steps have been saved, otherwise the
+    run has been interrupted and it is resumed from the last checkpoint """
+    if reloaded_emcee and os.path.exists(emcee_dir_output + 'sampler_chain.h5'):
+        nsteps_completed, nsteps = emcee_hdf5_nsteps(emcee_dir_output)
+        if mc.emcee_parameters['nsave'] > 0 \
+                and nsteps_completed // mc.emcee_parameters['nsave'] < int(nsteps / mc.emcee_parameters['nsave']):
+            mc.emcee_dir_output = emcee_dir_output
+            return pyorbit_emcee_resume(mc, starting_point, population, prob, state, sampler_chain,
+                                        sampler_lnprobability, sampler_acceptance_fraction, theta_dict,
+                                        nsteps_completed, nsteps, mpi_pool=mpi_pool, return_output=return_output)
+
     if reloaded_emcee:
         """ There's no need to do anything"""
         flatchain = emcee_flatchain(sampler_chain, mc.emcee_parameters['nburn'], mc.emcee_parameters['thin'])
@@ -66,6 +105,13 @@ def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
         results_analysis.print_integrated_ACF(sampler_chain, theta_dict, mc.emcee_parameters['thin'])
         results_analysis.results_resumen(mc, flatchain)
 
+        if not posterior_store_exists(emcee_dir_output):
+            posterior_store_save(emcee_dir_output, 'emcee', theta_dict, sampler_chain, sampler_lnprobability,
+                                 nburn=mc.emcee_parameters['nburn'], thin=mc.emcee_parameters['thin'])
+
+        if mpi_pool:
+            mpi_pool.close()
+
         if return_output:
             return mc, sampler_chain, sampler_lnprobability
         else:
@@ -116,8 +162,28 @@ def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
     if not getattr(mc, 'use_threading_pool', False):
         mc.use_threading_pool = False
 
+    if not mc.emcee_parameters.get('vectorize', False):
+        mc.emcee_parameters['vectorize'] = False
+
+    if mpi_pool:
+        mc.use_threading_pool = False
+        if mc.emcee_parameters['vectorize']:
+            print('WARNING: vectorized log-probability is not used with the MPI pool, option disabled')
+            mc.emcee_parameters['vectorize'] = False
+
+    if mc.emcee_parameters['vectorize'] and mc.emcee_parameters['version'] == '2':
+        print('WARNING: vectorized log-probability requires emcee version 3, option disabled')
+        mc.emcee_parameters['vectorize'] = False
+
+    if mc.emcee_parameters['vectorize'] and mc.use_threading_pool:
+        print('WARNING: vectorized log-probability is evaluated in a single process, threading pool disabled')
+        mc.use_threading_pool = False
+
     print()
     print('Using threading pool:', mc.use_threading_pool)
+    if mpi_pool:
+        print('Using MPI pool with {0:d} workers'.format(mpi_pool.n_processes))
+    print('Vectorized log-probability:', mc.emcee_parameters['vectorize'])
     print()
     print('*************************************************************')
     print()
@@ -167,10 +233,102 @@ def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
                 os.makedirs(mc.pyde_dir_output)
 
             print('PyDE running')
+
+            if mc.pyde_parameters['seed'] is not None:
+                print('PyDE random seed: ', mc.pyde_parameters['seed'])
+                pyde_random_seed(int(mc.pyde_parameters['seed']))
+            sys.stdout.flush()
+
+            """ The trial population of each generation is evaluated through the same pool used by emcee or,
+            alternatively, with a single call of the batch log-probability  """
+            pyde_pool = None
+            if mpi_pool:
+                mpi_pool.update(mc)
+                pyde_pool = mpi_pool
+            elif mc.use_threading_pool and not mc.pyde_parameters['vectorize']:
+                pyde_pool = ModelContainerPool(mc, mc.emcee_parameters['nwalkers'],
+                                               n_processes=mc.emcee_parameters.get('nprocesses', None),
+                                               chunksize=mc.emcee_parameters.get('chunksize', None))
+                print('Number of processes in the PyDE pool: ', pyde_pool.n_processes)
+
+            if pyde_pool:
+                de = DiffEvol(pool_log_probability, mc.bounds, mc.emcee_parameters['nwalkers'], maximize=True,
+                              seed=mc.pyde_parameters['seed'], pool=pyde_pool)
+            elif mc.pyde_parameters['vectorize']:
+                de = DiffEvol(mc, mc.bounds, mc.emcee_parameters['nwalkers'], maximize=True,
+                              seed=mc.pyde_parameters['seed'], vectorize=True)
+            else:
+                de = DiffEvol(mc, mc.bounds, mc.emcee_parameters['nwalkers'], maximize=True,
+                              seed=mc.pyde_parameters['seed'])
+
+            ngen = int(mc.pyde_parameters['ngen'])
+            nsave = int(mc.pyde_parameters['nsave'])
+            stop_window = int(mc.pyde_parameters['stop_window'])
+            stop_tolerance = mc.pyde_parameters['stop_tolerance']
+
+            theta_dict = results_analysis.get_theta_dictionary(mc)
+
+            """ The checkpoint may have been written by a process with a different order of the parameters,
+            the columns of the population are remapped through the theta dictionary saved in the checkpoint.
+            The checkpoint is ignored if the parameters or their boundaries have changed.
+            Only the state of the NumPy random generator is saved: the numba generator used by the evolution step
+            of PyDE (see pyde_random_seed) starts again from the seed, so that a resumed run does not reproduce
+            the population of an uninterrupted run """
+            generation = 0
+            try:
+                checkpoint_population, checkpoint_generation, checkpoint_random_state, \
+                    theta_dict_legacy, bounds_legacy = pyde_load_checkpoint(mc.pyde_dir_output)
+
+                checkpoint_compatible = theta_dict_legacy is not None \
+                    and set(theta_dict_legacy) == set(theta_dict) \
+                    and np.shape(checkpoint_population) == np.shape(de.population)
+
+                if checkpoint_compatible:
+                    population_legacy = np.zeros(np.shape(de.population), dtype=np.double)
+                    for theta_name, theta_i in theta_dict.items():
+                        population_legacy[:, theta_i] = checkpoint_population[:, theta_dict_legacy[theta_name]]
+                        if not np.allclose(mc.bounds[theta_i], bounds_legacy[theta_dict_legacy[theta_name]]):
+                            checkpoint_compatible = False
+
+                if checkpoint_compatible:
+                    de.population[:, :] = population_legacy
+                    generation = checkpoint_generation
+                    np.random.set_state(checkpoint_random_state)
+                    print('PyDE resumed from the checkpoint at generation ', generation)
+                else:
+                    print('WARNING: PyDE checkpoint not compatible with the current configuration, ignored')
+            except (IOError, OSError):
+                pass
             sys.stdout.flush()
 
-            de = DiffEvol(mc, mc.bounds, mc.emcee_parameters['nwalkers'], maximize=True)
-            de.optimize(int(mc.pyde_parameters['ngen']))
+            """ De-facto PyDE interface: calling the DiffEvol object returns a generator over the generations,
+            yielding the best member of the population and its fitness, i.e. -lnprob since maximize=True """
+            best_lnprob = []
+            n_generations = 0
+            time_start = default_timer()
+            for _, best_fitness in de(ngen - generation):
+                generation += 1
+                n_generations += 1
+
+                if nsave and generation % nsave == 0:
+                    pyde_save_checkpoint(mc, de.population, generation, np.random.get_state(), theta_dict)
+
+                if stop_window:
+                    best_lnprob.append(-best_fitness)
+                    if len(best_lnprob) > stop_window \
+                            and np.abs(best_lnprob[-1] - best_lnprob[-1 - stop_window]) < stop_tolerance:
+                        print('PyDE stopped at generation {0:d}: best lnprob changed less than {1:f} '
+                              'in the last {2:d} generations'.format(generation, stop_tolerance, stop_window))
+                        break
+
+            pyde_time = default_timer() - time_start
+            print('PyDE: {0:d} generations in {1:.1f} s, {2:.2f} generations per second'.format(
+                n_generations, pyde_time, n_generations / pyde_time))
+
+            if pyde_pool and not mpi_pool:
+                """ The model container of the workers is outdated if the bounds are redefined """
+                pyde_pool.close()
+                pyde_pool.join()
 
             population = de.population
             starting_point = np.median(population, axis=0)
@@ -194,12 +352,17 @@ def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
 
     results_analysis.results_resumen(mc, starting_point, compute_lnprob=True, is_starting_point=True)
 
-    if mc.use_threading_pool:
-        if mc.emcee_parameters['version'] == '2':
-            threads_pool = emcee.interruptible_pool.InterruptiblePool(mc.emcee_parameters['nwalkers'])
-        else:
-            from multiprocessing.pool import Pool as InterruptiblePool
-            threads_pool = InterruptiblePool(mc.emcee_parameters['nwalkers'])
+    threads_pool = None
+    if mpi_pool:
+        """ The model container may have been modified after the PyDE run """
+        mpi_pool.update(mc)
+        threads_pool = mpi_pool
+    elif mc.use_threading_pool:
+        threads_pool = ModelContainerPool(mc, mc.emcee_parameters['nwalkers'],
+                                          n_processes=mc.emcee_parameters.get('nprocesses', None),
+                                          chunksize=mc.emcee_parameters.get('chunksize', None))
+        print('Number of processes in the pool: ', threads_pool.n_processes)
+        print()
 
     if mc.emcee_parameters['multirun'] and not reloaded_emcee_multirun:
 
@@ -207,8 +370,11 @@ def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
             print('emcee exploratory run #', ii, ' of ', mc.emcee_parameters['multirun_iter'])
             # sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, mc,
             #                                 threads=mc.emcee_parameters['nwalkers'])
-            if mc.use_threading_pool:
-                sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, mc, pool=threads_pool)
+            if threads_pool:
+                sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, pool_log_probability,
+                                                pool=threads_pool)
+            elif mc.emcee_parameters['vectorize']:
+                sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, mc, vectorize=True)
             else:
                 sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, mc)
 
@@ -238,8 +404,21 @@ def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
     print('Running emcee')
     state = None
 
-    if mc.use_threading_pool:
-        sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, mc, pool=threads_pool)
+    """ With the HDF5 backend only the new steps are written at each checkpoint, the output of a previous
+    run that could not be reloaded is removed to start a new chain """
+    if mc.emcee_parameters['use_hdf5']:
+        emcee_save = emcee_save_to_hdf5
+        if os.path.exists(mc.emcee_dir_output + 'sampler_chain.h5'):
+            os.remove(mc.emcee_dir_output + 'sampler_chain.h5')
+        print('Chain saved in ', mc.emcee_dir_output + 'sampler_chain.h5')
+    else:
+        emcee_save = emcee_save_to_cpickle
+
+    if threads_pool:
+        sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, pool_log_probability,
+                                        pool=threads_pool)
+    elif mc.emcee_parameters['vectorize']:
+        sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, mc, vectorize=True)
     else:
         sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, mc)
 
@@ -249,10 +428,10 @@ def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
         niter = int(mc.emcee_parameters['nsteps']/mc.emcee_parameters['nsave'])
         sampled = 0
         for i in range(0, niter):
-            population, prob, state = sampler.run_mcmc(population, mc.emcee_parameters['nsave'], thin=mc.emcee_parameters['thin'], rstate0=state)
-            sampled += mc.emcee_parameters['nsave']
+            population, prob, state = sampler.run_mcmc(population, int(mc.emcee_parameters['nsave']), thin=mc.emcee_parameters['thin'], rstate0=state)
+            sampled += int(mc.emcee_parameters['nsave'])
             theta_dict = results_analysis.get_theta_dictionary(mc)
-            emcee_save_to_cpickle(mc, starting_point, population, prob, state, sampler, theta_dict, samples=sampled)
+            emcee_save(mc, starting_point, population, prob, state, sampler, theta_dict, samples=sampled)
 
             flatchain = emcee_flatchain(sampler.chain, mc.emcee_parameters['nburn'], mc.emcee_parameters['thin'])
             results_analysis.print_integrated_ACF(sampler.chain, theta_dict, mc.emcee_parameters['thin'])
@@ -267,16 +446,24 @@ def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
         population, prob, state = sampler.run_mcmc(population, mc.emcee_parameters['nsteps'], thin=mc.emcee_parameters['thin'])
 
         theta_dict = results_analysis.get_theta_dictionary(mc)
-        emcee_save_to_cpickle(mc, starting_point, population, prob, state, sampler, theta_dict)
+        emcee_save(mc, starting_point, population, prob, state, sampler, theta_dict)
 
         flatchain = emcee_flatchain(sampler.chain, mc.emcee_parameters['nburn'], mc.emcee_parameters['thin'])
         results_analysis.print_integrated_ACF(sampler.chain, theta_dict, mc.emcee_parameters['thin'])
         results_analysis.results_resumen(mc, flatchain)
+
+    posterior_store_save(mc.emcee_dir_output, 'emcee', theta_dict, sampler.chain, sampler.lnprobability,
+                         nburn=mc.emcee_parameters['nburn'], thin=mc.emcee_parameters['thin'])
+
     print()
     print('emcee completed')
 
+    if mc.profiler:
+        """ Only the likelihood calls performed in the main process are included """
+        mc.profiler.report()
+        mc.profiler.save(mc.emcee_dir_output + 'profiling.json')
 
-    if mc.use_threading_pool:
+    if threads_pool:
         # close the pool of threads
         threads_pool.close()
         threads_pool.terminate()
@@ -288,3 +475,90 @@ def pyorbit_emcee(config_in, input_datasets=None, return_output=None):
     if return_output:
         return mc, sampler.chain,  sampler.lnprobability
 
+
+def pyorbit_emcee_resume(mc, starting_point, population, prob, state, sampler_chain, sampler_lnprobability,
+                         sampler_acceptance_fraction, theta_dict, nsteps_completed, nsteps, mpi_pool=None,
+                         return_output=None):
+    """ Continuation of an interrupted emcee run saved with the HDF5 backend
+
+    The run is resumed with the model container saved together with the chain, since the order of the
+    parameters in theta of a new model container may be different. The sampler is restarted from the population
+    and the random state of the last checkpoint, the new steps are appended to sampler_chain.h5 """
+
+    mc.model_setup()
+    mc.initialize_logchi2()
+    mc.emcee_parameters['nsteps'] = nsteps
+
+    if mpi_pool:
+        mc.use_threading_pool = False
+        mc.emcee_parameters['vectorize'] = False
+
+    print()
+    print('Resuming emcee from the checkpoint at step {0:d} of {1:d}'.format(nsteps_completed, nsteps))
+    print()
+    sys.stdout.flush()
+
+    threads_pool = None
+    if mpi_pool:
+        mpi_pool.update(mc)
+        threads_pool = mpi_pool
+    elif mc.use_threading_pool:
+        threads_pool = ModelContainerPool(mc, mc.emcee_parameters['nwalkers'],
+                                          n_processes=mc.emcee_parameters.get('nprocesses', None),
+                                          chunksize=mc.emcee_parameters.get('chunksize', None))
+        print('Number of processes in the pool: ', threads_pool.n_processes)
+        print()
+
+    if threads_pool:
+        sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, pool_log_probability,
+                                        pool=threads_pool)
+    elif mc.emcee_parameters['vectorize']:
+        sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, mc, vectorize=True)
+    else:
+        sampler = emcee.EnsembleSampler(mc.emcee_parameters['nwalkers'], mc.ndim, mc)
+
+    """ The chain of the new sampler contains only the steps performed after the restart """
+    nsave = int(mc.emcee_parameters['nsave'])
+    chain_offset = np.shape(sampler_chain)[1]
+    sampled = nsteps_completed
+    for i in range(nsteps_completed // nsave, int(nsteps / nsave)):
+        population, prob, state = sampler.run_mcmc(population, nsave, thin=mc.emcee_parameters['thin'], rstate0=state)
+        sampled += nsave
+
+        acceptance_fraction = (sampler_acceptance_fraction * nsteps_completed
+                               + sampler.acceptance_fraction * (sampled - nsteps_completed)) / sampled
+        emcee_save_to_hdf5(mc, starting_point, population, prob, state, sampler, theta_dict, samples=sampled,
+                           chain_offset=chain_offset, acceptance_fraction=acceptance_fraction)
+
+        chain = np.concatenate((sampler_chain, sampler.chain), axis=1)
+        flatchain = emcee_flatchain(chain, mc.emcee_parameters['nburn'], mc.emcee_parameters['thin'])
+        results_analysis.print_integrated_ACF(chain, theta_dict, mc.emcee_parameters['thin'])
+        results_analysis.results_resumen(mc, flatchain)
+
+        print()
+        print(sampled, '  steps completed, average lnprob:, ', np.median(prob))
+
+        sys.stdout.flush()
+
+    chain = np.concatenate((sampler_chain, sampler.chain), axis=1)
+    lnprobability = np.concatenate((sampler_lnprobability, sampler.lnprobability), axis=1)
+
+    posterior_store_save(mc.emcee_dir_output, 'emcee', theta_dict, chain, lnprobability,
+                         nburn=mc.emcee_parameters['nburn'], thin=mc.emcee_parameters['thin'])
+
+    print()
+    print('emcee completed')
+
+    if mc.profiler:
+        mc.profiler.report()
+        mc.profiler.save(mc.emcee_dir_output + 'profiling.json')
+
+    if threads_pool:
+        threads_pool.close()
+        threads_pool.terminate()
+        threads_pool.join()
+
+    emcee_create_dummy_file(mc)
+
+    if return_output:
+        return mc, chain, lnprobability
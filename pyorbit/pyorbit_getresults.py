@@ -6,6 +6,7 @@ from pyorbit.classes.model_container_emcee import ModelContainerEmcee
 
 from pyorbit.classes.input_parser import pars_input
 from pyorbit.classes.io_subroutines import *
+from pyorbit.classes.posterior_store import PosteriorStore, posterior_store_exists
 import numpy as np
 import os
 import matplotlib as mpl
@@ -44,6 +45,7 @@ def pyorbit_getresults(config_in, sampler, plot_dictionary):
 
     sample_keyword = {
         'multinest': ['multinest', 'MultiNest', 'multi'],
+        'dynesty': ['dynesty', 'DyNesty', 'Dynesty', 'DYNESTY'],
         'polychord': ['polychord', 'PolyChord', 'polychrod', 'poly'],
         'emcee': ['emcee', 'MCMC', 'Emcee']
     }
@@ -54,9 +56,16 @@ def pyorbit_getresults(config_in, sampler, plot_dictionary):
         dir_output = './' + config_in['output'] + '/emcee_plot/'
         os.system('mkdir -p ' + dir_output)
 
-        mc, starting_point, population, prob, state, \
-        sampler_chain, sampler_lnprobability, sampler_acceptance_fraction, _ = \
-            emcee_load_from_cpickle(dir_input)
+        """ With the posterior store only the model container is unpickled, the chains are memory-mapped """
+        if posterior_store_exists(dir_input):
+            posterior_store = PosteriorStore(dir_input)
+            mc = model_container_load_from_cpickle(dir_input)
+            sampler_chain = posterior_store.chains()
+        else:
+            posterior_store = None
+            mc, starting_point, population, prob, state, \
+            sampler_chain, sampler_lnprobability, sampler_acceptance_fraction, _ = \
+                emcee_load_from_cpickle(dir_input)
 
         pars_input(config_in, mc, reload_emcee=True)
 
@@ -74,14 +83,25 @@ def pyorbit_getresults(config_in, sampler, plot_dictionary):
         nthin = int(mc.emcee_parameters['thin'])
         nsteps = int(sampler_chain.shape[1] * nthin)
 
-        flat_chain = emcee_flatchain(sampler_chain, nburnin, nthin)
-        flat_lnprob = emcee_flatlnprob(sampler_lnprobability, nburnin, nthin, emcee_version)
+        if posterior_store:
+            """ Statistics are computed one parameter at a time, flat_chain is a view of the store """
+            sampler_lnprobability = posterior_store.lnprob if emcee_version == '3' \
+                else posterior_store.lnprob_chains()
+            flat_chain = posterior_store.flat_samples(nburnin)
+            flat_lnprob = posterior_store.flat_lnprob(nburnin)
 
-        flat_BiC = -2 * flat_lnprob + mc.ndim * np.log(mc.ndata)
+            lnprob_med = posterior_store.lnprob_value_sigma(nburnin)
+            chain_med = posterior_store.compute_value_sigma(nburnin)
+            chain_MAP, lnprob_MAP = posterior_store.pick_MAP_parameters(nburnin)
+        else:
+            flat_chain = emcee_flatchain(sampler_chain, nburnin, nthin)
+            flat_lnprob = emcee_flatlnprob(sampler_lnprobability, nburnin, nthin, emcee_version)
 
-        lnprob_med = common.compute_value_sigma(flat_lnprob)
-        chain_med = common.compute_value_sigma(flat_chain)
-        chain_MAP, lnprob_MAP = common.pick_MAP_parameters(flat_chain, flat_lnprob)
+            lnprob_med = common.compute_value_sigma(flat_lnprob)
+            chain_med = common.compute_value_sigma(flat_chain)
+            chain_MAP, lnprob_MAP = common.pick_MAP_parameters(flat_chain, flat_lnprob)
+
+        flat_BiC = -2 * flat_lnprob + mc.ndim * np.log(mc.ndata)
 
         n_samplings, n_pams = np.shape(flat_chain)
 
@@ -99,13 +119,17 @@ def pyorbit_getresults(config_in, sampler, plot_dictionary):
 
         results_analysis.print_integrated_ACF(sampler_chain, theta_dictionary, nthin)
 
-    if sampler in sample_keyword['multinest']:
+    if sampler in sample_keyword['multinest'] or sampler in sample_keyword['dynesty']:
         plot_dictionary['lnprob_chain'] = False
         plot_dictionary['chains'] = False
         plot_dictionary['traces'] = False
 
-        dir_input = './' + config_in['output'] + '/multinest/'
-        dir_output = './' + config_in['output'] + '/multinest_plot/'
+        if sampler in sample_keyword['multinest']:
+            dir_input = './' + config_in['output'] + '/multinest/'
+            dir_output = './' + config_in['output'] + '/multinest_plot/'
+        else:
+            dir_input = './' + config_in['output'] + '/dynesty/'
+            dir_output = './' + config_in['output'] + '/dynesty_plot/'
         os.system('mkdir -p ' + dir_output)
 
         mc = nested_sampling_load_from_cpickle(dir_input)
@@ -117,16 +141,26 @@ def pyorbit_getresults(config_in, sampler, plot_dictionary):
         """ Required to create the right objects inside each class - if defined inside """
         theta_dictionary = results_analysis.get_theta_dictionary(mc)
 
-        data_in = np.genfromtxt(dir_input + 'post_equal_weights.dat')
-        flat_lnprob = data_in[:, -1]
-        flat_chain = data_in[:, :-1]
+        if posterior_store_exists(dir_input):
+            posterior_store = PosteriorStore(dir_input)
+            flat_chain = posterior_store.flat_samples()
+            flat_lnprob = posterior_store.flat_lnprob()
+
+            lnprob_med = posterior_store.lnprob_value_sigma()
+            chain_med = posterior_store.compute_value_sigma()
+            chain_MAP, lnprob_MAP = posterior_store.pick_MAP_parameters()
+        else:
+            data_in = np.genfromtxt(dir_input + 'post_equal_weights.dat')
+            flat_lnprob = data_in[:, -1]
+            flat_chain = data_in[:, :-1]
+
+            lnprob_med = common.compute_value_sigma(flat_lnprob)
+            chain_med = common.compute_value_sigma(flat_chain)
+            chain_MAP, lnprob_MAP = common.pick_MAP_parameters(flat_chain, flat_lnprob)
+
         # nsample = np.size(flat_lnprob)
         n_samplings, n_pams = np.shape(flat_chain)
 
-        lnprob_med = common.compute_value_sigma(flat_lnprob)
-        chain_med = common.compute_value_sigma(flat_chain)
-        chain_MAP, lnprob_MAP = common.pick_MAP_parameters(flat_chain, flat_lnprob)
-
         print()
         print(' Reference Time Tref: {}'.format(mc.Tref))
         print()
@@ -154,17 +188,26 @@ def pyorbit_getresults(config_in, sampler, plot_dictionary):
         """ Required to create the right objects inside each class - if defined inside """
         theta_dictionary = results_analysis.get_theta_dictionary(mc)
 
-        data_in = np.genfromtxt(dir_input + 'pyorbit_equal_weights.txt')
-        flat_lnprob = data_in[:, 1]
-        flat_chain = data_in[:, 2:]
-        # nsample = np.size(flat_lnprob)
+        if posterior_store_exists(dir_input):
+            posterior_store = PosteriorStore(dir_input)
+            flat_chain = posterior_store.flat_samples()
+            flat_lnprob = posterior_store.flat_lnprob()
 
-        n_samplings, n_pams = np.shape(flat_chain)
+            lnprob_med = posterior_store.lnprob_value_sigma()
+            chain_med = posterior_store.compute_value_sigma()
+            chain_MAP, lnprob_MAP = posterior_store.pick_MAP_parameters()
+        else:
+            data_in = np.genfromtxt(dir_input + 'pyorbit_equal_weights.txt')
+            flat_lnprob = data_in[:, 1]
+            flat_chain = data_in[:, 2:]
 
-        lnprob_med = common.compute_value_sigma(flat_lnprob)
-        chain_med = common.compute_value_sigma(flat_chain)
+            lnprob_med = common.compute_value_sigma(flat_lnprob)
+            chain_med = common.compute_value_sigma(flat_chain)
 
-        chain_MAP, lnprob_MAP = common.pick_MAP_parameters(flat_chain, flat_lnprob)
+            chain_MAP, lnprob_MAP = common.pick_MAP_parameters(flat_chain, flat_lnprob)
+
+        # nsample = np.size(flat_lnprob)
+        n_samplings, n_pams = np.shape(flat_chain)
 
         print()
         print(' Reference Time Tref: {}'.format(mc.Tref))
@@ -539,9 +582,16 @@ def pyorbit_getresults(config_in, sampler, plot_dictionary):
             if dataset.kind == 'RV':
                 bjd_plot[dataset_name] = bjd_plot['full']
 
+        if getattr(mc, 'profiler', None):
+            mc.profiler.reset()
+
         bjd_plot['model_out'], bjd_plot['model_x'] = results_analysis.get_model(mc, chain_med[:, 0], bjd_plot)
         bjd_plot['MAP_model_out'], bjd_plot['MAP_model_x'] = results_analysis.get_model(mc, chain_MAP, bjd_plot)
 
+        if getattr(mc, 'profiler', None):
+            mc.profiler.report()
+            mc.profiler.save(dir_output + 'profiling_get_model.json')
+
         if plot_dictionary['plot_models']:
             print(' Writing the plots ')
 
@@ -3,6 +3,7 @@ from pyorbit.classes.common import *
 from pyorbit.classes.model_container_multinest import ModelContainerMultiNest
 from pyorbit.classes.input_parser import yaml_parser, pars_input
 from pyorbit.classes.io_subroutines import nested_sampling_save_to_cpickle, nested_sampling_load_from_cpickle, nested_sampling_create_dummy_file
+from pyorbit.classes.posterior_store import posterior_store_save
 import pyorbit.classes.results_analysis as results_analysis
 import os
 import sys
@@ -32,6 +33,7 @@ def pyorbit_multinest(config_in, input_datasets=None, return_output=None):
     mc.model_setup()
     mc.create_variables_bounds()
     mc.initialize_logchi2()
+    mc.prepare_nested_sampling_priors()
 
     mc.create_starting_point()
 
@@ -89,7 +91,11 @@ def pyorbit_multinest(config_in, input_datasets=None, return_output=None):
 
     analyzer = pymultinest.Analyzer(mc.ndim, outputfiles_basename=output_directory)
     stats = analyzer.get_stats()
-    samples = analyzer.get_equal_weighted_posterior()[:, :-1]
+    equal_weighted_posterior = analyzer.get_equal_weighted_posterior()
+    samples = equal_weighted_posterior[:, :-1]
+
+    posterior_store_save(output_directory, 'multinest', results_analysis.get_theta_dictionary(mc),
+                         samples, equal_weighted_posterior[:, -1])
 
     result = dict(logZ=stats['nested sampling global log-evidence'],
          logZerr=stats['nested sampling global log-evidence error'],
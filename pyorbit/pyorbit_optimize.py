@@ -60,6 +60,10 @@ def pyorbit_optimize(config_in, input_datasets=None, return_output=None):
     output_results = optimize_results['x']
     print(optimize_results['success'])
 
+    if mc.profiler:
+        mc.profiler.report()
+        mc.profiler.save(mc.optimize_dir_output + 'profiling.json')
+
     if optimize_results['success']:
 
         results_analysis.results_resumen(mc, output_results, compute_lnprob=True)
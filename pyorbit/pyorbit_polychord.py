@@ -4,6 +4,7 @@ from pyorbit.classes.model_container_polychord import ModelContainerPolyChord
 from pyorbit.classes.input_parser import yaml_parser, pars_input
 from pyorbit.classes.io_subroutines import nested_sampling_save_to_cpickle, nested_sampling_load_from_cpickle, \
     nested_sampling_create_dummy_file
+from pyorbit.classes.posterior_store import posterior_store_save
 import pyorbit.classes.results_analysis as results_analysis
 import os
 import sys
@@ -38,6 +39,7 @@ def pyorbit_polychord(config_in, input_datasets=None, return_output=None):
     mc.model_setup()
     mc.create_variables_bounds()
     mc.initialize_logchi2()
+    mc.prepare_nested_sampling_priors()
 
     mc.create_starting_point()
 
@@ -82,6 +84,11 @@ def pyorbit_polychord(config_in, input_datasets=None, return_output=None):
 
     nested_sampling_save_to_cpickle(mc)
 
+    """ Same columns read by pyorbit_getresults from the equally-weighted samples """
+    data_in = np.genfromtxt(output_directory + 'pyorbit_equal_weights.txt')
+    posterior_store_save(output_directory, 'polychord', results_analysis.get_theta_dictionary(mc),
+                         data_in[:, 2:], data_in[:, 1])
+
     print()
     print('PolyChord COMPLETED')
     print()
@@ -0,0 +1,85 @@
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import pyorbit
+from pyorbit.classes.model_container_emcee import ModelContainerEmcee
+from pyorbit.classes.model_container_dynesty import ModelContainerDynesty
+from pyorbit.classes.input_parser import pars_input
+
+examples_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+""" Attributes of the model container introduced after the release of the previous version, not available
+in the containers pickled by that version (e.g., in the output directories read by GetResults) """
+attributes_previous_version = ['bounds_check_ordered', 'bounds_check_overlap', 'bounds_check_planets',
+                               'dataset_threads', 'dataset_threads_groups', 'dataset_threads_pool',
+                               'execution_plan', 'linear_marginalization', 'linear_marginalization_parameters',
+                               'model_cache', 'model_setup_required', 'nested_sampling_groups',
+                               'parameter_map_fixed', 'parameter_map_groups', 'parameter_map_others',
+                               'parameter_map_slots', 'parameter_map_variables', 'priors_constant',
+                               'priors_groups', 'profiler']
+
+
+def new_instance(cls):
+    return cls.__new__(cls)
+
+
+class PickledWithoutAttributes(object):
+    """ Pickled as the wrapped object, without the selected attributes and without calling its __getstate__,
+    the same stream written by a version of the class that did not have those attributes """
+
+    def __init__(self, obj, removed_attributes):
+        self.obj = obj
+        self.removed_attributes = removed_attributes
+
+    def __reduce__(self):
+        state = {key: value for key, value in self.obj.__dict__.items() if key not in self.removed_attributes}
+        return new_instance, (type(self.obj),), state
+
+
+def model_container_setup(config_file, model_container_class=ModelContainerEmcee):
+    mc = model_container_class()
+    pars_input(pyorbit.yaml_parser(config_file), mc)
+    mc.model_setup()
+    mc.create_variables_bounds()
+    mc.initialize_logchi2()
+    return mc
+
+
+@pytest.fixture
+def model_container(monkeypatch):
+    monkeypatch.chdir(examples_directory)
+    return model_container_setup('simulated_correlated_datasets_example01.yaml')
+
+
+def sample_theta(mc, n_samples=8):
+    random_state = np.random.RandomState(1)
+    return mc.bounds[:, 0] + (mc.bounds[:, 1] - mc.bounds[:, 0]) * random_state.uniform(size=(n_samples, mc.ndim))
+
+
+@pytest.mark.parametrize('removed_attributes', [attributes_previous_version, ['model_cache']])
+def test_log_probability_older_pickle(model_container, removed_attributes):
+    theta = sample_theta(model_container)
+    log_probability = [model_container(theta_i) for theta_i in theta]
+
+    """ A previous call fills the execution plan, which is then pickled unless removed """
+    mc = pickle.loads(pickle.dumps(PickledWithoutAttributes(model_container, removed_attributes)))
+
+    assert isinstance(mc, ModelContainerEmcee)
+    assert mc.model_cache == {}
+    np.testing.assert_allclose([mc(theta_i) for theta_i in theta], log_probability)
+    np.testing.assert_allclose(mc(theta), log_probability)
+
+
+def test_nested_sampling_priors_older_pickle(monkeypatch):
+    monkeypatch.chdir(examples_directory)
+    model_container = model_container_setup('simulated_correlated_datasets_example01.yaml', ModelContainerDynesty)
+
+    cube = np.random.RandomState(1).uniform(size=(8, model_container.ndim))
+    theta = [model_container.dynesty_priors(cube_i) for cube_i in cube]
+
+    mc = pickle.loads(pickle.dumps(PickledWithoutAttributes(model_container, attributes_previous_version)))
+
+    np.testing.assert_allclose([mc.dynesty_priors(cube_i) for cube_i in cube], theta)